@@ -0,0 +1,86 @@
+from classes import DRAW_MOVE
+
+# Fixed discrete action space: every move of the game gets one index, so move choices can be
+# handled as integers by the batch engine and by learning code. Moves to the foundation name no
+# slot (the card goes to the slot Game.foundation_slot picks), so an action is the same in every
+# position; moves between tableau piles are listed for every (from pile, to pile, number of cards).
+#
+#   0          draw from the stockpile (or turn the waste over)
+#   1          waste -> foundation
+#   2..8       waste -> tableau pile j
+#   9..15      tableau pile i -> foundation
+#   16..43     foundation slot s -> tableau pile j          16 + s * 7 + j
+#   44..680    tableau pile i -> tableau pile j, k cards    44 + (i * 7 + j) * 13 + k - 1
+# Moves from a pile onto itself are part of the numbering but are never legal.
+
+MAX_RUN = 13  # Most cards a tableau move can carry (King down to Ace)
+ACTION_DRAW = 0
+ACTION_WASTE_TO_FOUNDATION = 1
+ACTION_WASTE_TO_TABLEAU = 2
+ACTION_TABLEAU_TO_FOUNDATION = 9
+ACTION_FOUNDATION_TO_TABLEAU = 16
+ACTION_TABLEAU_TO_TABLEAU = 44
+ACTION_COUNT = ACTION_TABLEAU_TO_TABLEAU + 7 * 7 * MAX_RUN
+
+def move_to_action(move):
+    # Action index of a move tuple (see Game.apply_move)
+    from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+    if from_pile_name == "stock":
+        return ACTION_DRAW
+    if from_pile_name == "waste":
+        if to_pile_name == "foundation":
+            return ACTION_WASTE_TO_FOUNDATION
+        return ACTION_WASTE_TO_TABLEAU + to_index
+    if from_pile_name == "foundation":
+        return ACTION_FOUNDATION_TO_TABLEAU + from_index * 7 + to_index
+    if to_pile_name == "foundation":
+        return ACTION_TABLEAU_TO_FOUNDATION + from_index
+    return ACTION_TABLEAU_TO_TABLEAU + (from_index * 7 + to_index) * MAX_RUN + num_cards - 1
+
+def action_to_move(game, action):
+    # Move tuple for an action index in `game`'s position. Foundation moves get their slot from
+    # the card being moved; if there is no such card or slot the move still comes back, with slot 0,
+    # and Game.apply_move rejects it.
+    if action == ACTION_DRAW:
+        return DRAW_MOVE
+    if action == ACTION_WASTE_TO_FOUNDATION:
+        card = None if game.waste_pile.is_empty() else game.waste_pile.top_card()
+        return ('waste', 0, 'foundation', foundation_slot_of(game, card), 1)
+    if action < ACTION_TABLEAU_TO_FOUNDATION:
+        return ('waste', 0, 'tableau', action - ACTION_WASTE_TO_TABLEAU, 1)
+    if action < ACTION_FOUNDATION_TO_TABLEAU:
+        i = action - ACTION_TABLEAU_TO_FOUNDATION
+        pile = game.tableau.piles[i]
+        card = None if pile.is_empty() else pile.get_last()
+        return ('tableau', i, 'foundation', foundation_slot_of(game, card), 1)
+    if action < ACTION_TABLEAU_TO_TABLEAU:
+        slot, j = divmod(action - ACTION_FOUNDATION_TO_TABLEAU, 7)
+        return ('foundation', slot, 'tableau', j, 1)
+    piles, k = divmod(action - ACTION_TABLEAU_TO_TABLEAU, MAX_RUN)
+    i, j = divmod(piles, 7)
+    return ('tableau', i, 'tableau', j, k + 1)
+
+def foundation_slot_of(game, card):
+    slot = None if card is None else game.foundation_slot(card)
+    return 0 if slot is None else slot
+
+def legal_actions(game):
+    # Action indices of the legal moves of an object-based Game
+    return [move_to_action(move) for move in game.legal_moves()]
+
+def describe_action(action):
+    # Readable form of an action index, e.g. 'tableau 2 -> tableau 5 (3 cards)'
+    if action == ACTION_DRAW:
+        return "draw"
+    if action == ACTION_WASTE_TO_FOUNDATION:
+        return "waste -> foundation"
+    if action < ACTION_TABLEAU_TO_FOUNDATION:
+        return f"waste -> tableau {action - ACTION_WASTE_TO_TABLEAU}"
+    if action < ACTION_FOUNDATION_TO_TABLEAU:
+        return f"tableau {action - ACTION_TABLEAU_TO_FOUNDATION} -> foundation"
+    if action < ACTION_TABLEAU_TO_TABLEAU:
+        slot, j = divmod(action - ACTION_FOUNDATION_TO_TABLEAU, 7)
+        return f"foundation {slot} -> tableau {j}"
+    piles, k = divmod(action - ACTION_TABLEAU_TO_TABLEAU, MAX_RUN)
+    i, j = divmod(piles, 7)
+    return f"tableau {i} -> tableau {j} ({k + 1} card{'s' if k else ''})"
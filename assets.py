@@ -0,0 +1,138 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pygame
+from classes import ASSET_DIR, CARD_SIZE, RANKS, SUITS, card_sprites, get_card_sprite
+from debug_log import logger
+
+# Process-wide registry of everything the UI draws. Each asset is read from disk, scaled and
+# converted to the screen format once; after that a lookup is a dict access, so the frame loop
+# does no file I/O and allocates no surfaces in steady state.
+# Asset names are paths relative to ASSET_DIR written with '/' (e.g. "images/bg.png").
+
+TEXT_CACHE_SIZE = 512  # Rendered strings kept before the oldest are dropped (timer text keeps changing)
+
+images = {}  # (name, size) -> Surface
+fonts = {}  # (name, size, italic) -> Font
+texts = {}  # (text, font, color) -> rendered Surface
+overlays = {}  # (size, color) -> filled SRCALPHA Surface
+sounds = {}  # name -> Sound
+pending = []  # (registry, key) of images loaded on a worker thread and not converted yet
+
+class SilentSound:
+    # Stand-in for a sound that could not be loaded (missing file or no audio device)
+    def play(self, *args, **kwargs):
+        return None
+
+def asset_path(name):
+    return os.path.join(ASSET_DIR, *name.split("/"))
+
+def display_ready():
+    # Surfaces can only be converted to the screen format once a display mode is set
+    return pygame.display.get_init() and pygame.display.get_surface() is not None
+
+def on_main_thread():
+    # Surfaces are only converted on the main thread, which owns the display
+    return threading.current_thread() is threading.main_thread()
+
+def get_image(name, size=None):
+    # Return the image `name` scaled to `size` (or left at its own size), loading it the first time
+    key = (name, size)
+    image = images.get(key)
+    if image is None:
+        image = load_image(name, size)
+        images[key] = image
+        if not on_main_thread():
+            pending.append((images, key))
+    return image
+
+def load_image(name, size):
+    try:
+        image = pygame.image.load(asset_path(name))
+    except (pygame.error, FileNotFoundError) as e:
+        logger.warning("Error loading image '%s': %s", name, e)
+        image = pygame.Surface(size or (1, 1), pygame.SRCALPHA)  # Transparent placeholder
+    if size is not None and image.get_size() != size:
+        image = pygame.transform.scale(image, size)
+    if display_ready() and on_main_thread():
+        image = image.convert_alpha()  # Match the screen format so blits are fast
+    return image
+
+def get_font(name, size, italic=False):
+    # Return a font; `name` None is pygame's default font, anything else is looked up as a system font
+    key = (name, size, italic)
+    font = fonts.get(key)
+    if font is None:
+        if name is None:
+            font = pygame.font.Font(None, size)
+            font.set_italic(italic)
+        else:
+            font = pygame.font.SysFont(name, size, italic=italic)
+        fonts[key] = font
+    return font
+
+def render_text(text, font, color):
+    # Return `text` rendered (antialiased) in `font` and `color`, rendering it only the first time
+    key = (text, font, color)
+    surface = texts.get(key)
+    if surface is None:
+        if len(texts) >= TEXT_CACHE_SIZE:
+            del texts[next(iter(texts))]  # Drop the oldest entry
+        surface = font.render(text, True, color)
+        texts[key] = surface
+    return surface
+
+def get_overlay(size, color):
+    # Return a surface of `size` filled with the (semi-transparent) RGBA `color`
+    key = (size, color)
+    overlay = overlays.get(key)
+    if overlay is None:
+        overlay = pygame.Surface(size, pygame.SRCALPHA)
+        overlay.fill(color)
+        overlays[key] = overlay
+    return overlay
+
+def get_sound(name):
+    sound = sounds.get(name)
+    if sound is None:
+        try:
+            sound = pygame.mixer.Sound(asset_path(name))
+        except (pygame.error, FileNotFoundError) as e:
+            logger.warning("Error loading sound '%s': %s", name, e)
+            sound = SilentSound()
+        sounds[name] = sound
+    return sound
+
+def preload(image_list=(), font_list=(), sound_list=(), cards=True):
+    # Load everything up front so the first frames don't stall on disk reads.
+    # image_list holds (name, size) pairs and font_list (name, size, italic) triples.
+    for name, size in image_list:
+        get_image(name, size)
+    for name, size, italic in font_list:
+        get_font(name, size, italic)
+    for name in sound_list:
+        get_sound(name)
+    if cards:
+        for suit in SUITS:
+            for rank in RANKS:
+                key = (rank, suit, CARD_SIZE)
+                if key not in card_sprites and not on_main_thread():
+                    pending.append((card_sprites, key))
+                get_card_sprite(rank, suit, CARD_SIZE)
+
+def convert_pending():
+    # Convert the images a worker thread loaded to the screen format. Call it on the main thread
+    # once the load is done and the display mode is set.
+    if display_ready():
+        for registry, key in pending:
+            registry[key] = registry[key].convert_alpha()
+        pending.clear()
+
+def preload_in_background(image_list=(), font_list=(), sound_list=(), cards=True):
+    # Run preload() on a worker thread so loading overlaps with whatever the main thread is doing
+    # (the intro). Returns a Future that is done once everything is loaded. The worker only reads,
+    # decodes and scales; convert_pending() then converts the images on the main thread.
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asset-loader")
+    loading = executor.submit(preload, image_list, font_list, sound_list, cards)
+    executor.shutdown(wait=False)  # The worker exits once the load is done
+    return loading
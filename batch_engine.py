@@ -0,0 +1,385 @@
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from actions import (ACTION_COUNT, ACTION_DRAW, ACTION_FOUNDATION_TO_TABLEAU, ACTION_TABLEAU_TO_FOUNDATION,
+                     ACTION_TABLEAU_TO_TABLEAU, ACTION_WASTE_TO_FOUNDATION, ACTION_WASTE_TO_TABLEAU, MAX_RUN)
+from classes import CODE_COLOR, CODE_RANK, CODE_SUIT, Deck, decode_deal
+
+# Struct-of-arrays Klondike engine: thousands of games held in NumPy arrays and stepped all at
+# once, one action (see actions.py) per game per step. It follows the rules of Game exactly
+# (checked move for move against it), but a step costs a handful of array operations for the
+# whole batch instead of Python calls per card, which is what policy evaluation over millions
+# of games needs. NumPy is only needed here and in env.py; the game itself does not use it.
+#
+# Per game:  tableau           card codes per pile, bottom card first, EMPTY past the pile size
+#            tableau_sizes     cards per tableau pile; the first face_down of them are face down
+#            foundation_sizes  cards per foundation slot; foundation_suits the suit in it (EMPTY if none)
+#            talon             stockpile and waste as one row: talon[:waste_sizes] is the waste
+#                              (top card last), talon[waste_sizes:talon_sizes] the stockpile, front first
+
+MAX_PILE_DEPTH = 19  # 6 face-down cards under a full King-to-Ace run
+TALON_SIZE = 24  # Cards left over for the stockpile after the deal
+EMPTY = -1  # Card code of an empty slot
+MAX_STEPS = 2000  # Games still running after this many steps are cut off
+
+# Per-code lookup tables with one extra entry at the end, so EMPTY (-1) indexes a value that
+# never matches a real card
+RANK = np.array(CODE_RANK + (-2,), dtype=np.int8)
+SUIT = np.array(CODE_SUIT + (0,), dtype=np.int8)
+# A card fits on a tableau card when its KEY (rank and color) equals the NEED of the card below it
+KEY = np.array([CODE_RANK[code] * 2 + CODE_COLOR[code] for code in range(52)] + [100], dtype=np.int8)
+NEED = np.array([CODE_RANK[code] * 2 - 1 - CODE_COLOR[code] for code in range(52)] + [-100], dtype=np.int8)
+
+PILES = np.arange(7)
+RUNS = np.arange(1, MAX_RUN + 1)
+# Where the deal puts the deck: Game pops cards off the end of Deck.codes() into the tableau, pile
+# by pile, then the rest go to the stockpile in the order they are popped
+DEAL_PILE = np.array([i for i in range(7) for j in range(i + 1)])
+DEAL_DEPTH = np.array([j for i in range(7) for j in range(i + 1)])
+DEAL_SOURCE = 51 - np.arange(28)
+TALON_SOURCE = np.arange(TALON_SIZE - 1, -1, -1)
+
+def fits_tableau(cards, needs, empty):
+    # Whether `cards` may be placed on tableau piles whose top cards have the NEED values `needs`;
+    # `empty` marks empty piles, which take any card. The three arrays broadcast against each other.
+    return (KEY[cards] == needs) | (empty & (cards != EMPTY))
+
+class BatchGame:
+    def __init__(self, count, draw_count=1):
+        self.count = count
+        self.rows = np.arange(count)
+        self.draw_counts = np.full(count, draw_count, np.int8)
+        self.tableau = np.full((count, 7, MAX_PILE_DEPTH), EMPTY, np.int8)
+        self.tableau_sizes = np.zeros((count, 7), np.int8)
+        self.face_down = np.zeros((count, 7), np.int8)
+        self.foundation_sizes = np.zeros((count, 4), np.int8)
+        self.foundation_suits = np.full((count, 4), EMPTY, np.int8)
+        self.talon = np.full((count, TALON_SIZE), EMPTY, np.int8)
+        self.talon_sizes = np.zeros(count, np.int8)
+        self.waste_sizes = np.zeros(count, np.int8)
+        self.steps = np.zeros(count, np.int32)  # Legal actions taken since the deal
+        self.pile_starts = (self.rows[:, None] * 7 + PILES) * MAX_PILE_DEPTH  # Flat index of each pile's bottom slot
+
+    def deal(self, seeds=None, deals=None, games=None):
+        # Deal fresh games from deal numbers or from deal bytes (see encode_deal), the same deals
+        # Game would make. `games` picks the batch entries to deal (all by default).
+        if deals is not None:
+            orders = [decode_deal(deal) for deal in deals]
+        else:
+            orders = [Deck(seed).codes() for seed in seeds]
+        games = self.rows if games is None else np.asarray(games)
+        self.set_deck_orders(games, np.array(orders, np.int8).reshape(len(games), 52))
+
+    def set_deck_orders(self, games, orders):
+        # Deal deck orders ([len(games), 52], as Deck.codes() lists them) into the given games
+        self.tableau[games] = EMPTY
+        self.tableau[games[:, None], DEAL_PILE, DEAL_DEPTH] = orders[:, DEAL_SOURCE]
+        self.tableau_sizes[games] = PILES + 1
+        self.face_down[games] = PILES
+        self.foundation_sizes[games] = 0
+        self.foundation_suits[games] = EMPTY
+        self.talon[games] = orders[:, TALON_SOURCE]
+        self.talon_sizes[games] = TALON_SIZE
+        self.waste_sizes[games] = 0
+        self.steps[games] = 0
+
+    def load_game(self, index, game):
+        # Copy the position of an object-based Game into batch entry `index`
+        self.draw_counts[index] = game.draw_count
+        self.tableau[index] = EMPTY
+        for i, pile in game.tableau.piles.items():
+            cards = pile.display()
+            self.tableau[index, i, :len(cards)] = [card.code for card in cards]
+            self.tableau_sizes[index, i] = len(cards)
+            self.face_down[index, i] = sum(not card.face_up for card in cards)
+        for slot, pile in enumerate(game.foundation.piles):
+            self.foundation_sizes[index, slot] = pile.size()
+            self.foundation_suits[index, slot] = EMPTY if pile.is_empty() else pile.peek().suit_id
+        waste = game.waste_pile.cards.items
+        talon = [card.code for card in waste + game.stockpile.display()]
+        self.talon[index] = EMPTY
+        self.talon[index, :len(talon)] = talon
+        self.talon_sizes[index] = len(talon)
+        self.waste_sizes[index] = len(waste)
+        self.steps[index] = 0
+
+    def tableau_tops(self):
+        # Top card of every tableau pile ([count, 7]); EMPTY for an empty pile or a face-down top
+        sizes = self.tableau_sizes.astype(np.intp)
+        tops = self.tableau[self.rows[:, None], PILES, np.maximum(sizes - 1, 0)]
+        return np.where(sizes > self.face_down, tops, EMPTY)
+
+    def waste_tops(self):
+        sizes = self.waste_sizes.astype(np.intp)
+        return np.where(sizes > 0, self.talon[self.rows, np.maximum(sizes - 1, 0)], EMPTY)
+
+    def foundation_tops(self):
+        # Top card of every foundation slot ([count, 4]), EMPTY for an empty slot
+        return np.where(self.foundation_sizes > 0, self.foundation_suits * 13 + self.foundation_sizes - 1,
+                        EMPTY).astype(np.int8)
+
+    def suit_heights(self):
+        # Cards of each suit on the foundation ([count, 4], by suit id), i.e. the rank each suit needs next
+        in_slot = self.foundation_suits[:, :, None] == np.arange(4)
+        return (in_slot * self.foundation_sizes[:, :, None]).sum(axis=1)
+
+    def fits_foundation(self, cards, heights):
+        # [count, m]: whether each of `cards` ([count, m]) may go to the foundation
+        return (cards != EMPTY) & (RANK[cards] == heights[self.rows[:, None], SUIT[cards]])
+
+    def legal_mask(self, out=None):
+        # [count, ACTION_COUNT] booleans, True for the legal actions of each game.
+        # Pass `out` (a C-contiguous array of that shape) to fill it instead of making a new one.
+        count = self.count
+        mask = np.empty((count, ACTION_COUNT), bool) if out is None else out
+        tops = self.tableau_tops()
+        needs = NEED[tops]
+        empty = self.tableau_sizes == 0
+        heights = self.suit_heights()
+        waste = self.waste_tops()
+        mask[:, ACTION_DRAW] = self.talon_sizes > 0
+        mask[:, ACTION_WASTE_TO_FOUNDATION] = self.fits_foundation(waste[:, None], heights)[:, 0]
+        mask[:, ACTION_WASTE_TO_TABLEAU:ACTION_TABLEAU_TO_FOUNDATION] = fits_tableau(waste[:, None], needs, empty)
+        mask[:, ACTION_TABLEAU_TO_FOUNDATION:ACTION_FOUNDATION_TO_TABLEAU] = self.fits_foundation(tops, heights)
+        mask[:, ACTION_FOUNDATION_TO_TABLEAU:ACTION_TABLEAU_TO_TABLEAU] = fits_tableau(
+            self.foundation_tops()[:, :, None], needs[:, None, :], empty[:, None, :]).reshape(count, 28)
+        # Tableau to tableau. A face-up run descends one rank per card, so onto a non-empty pile
+        # only one run of another pile can fit: the one whose base is one rank below that pile's top.
+        # Its length follows from the two top ranks, and only that base card is fetched and checked,
+        # so each game looks at 7 x 7 candidates instead of every run length.
+        runs = mask[:, ACTION_TABLEAU_TO_TABLEAU:].reshape(count, 7, 7, MAX_RUN)  # View: [count, from, to, cards]
+        runs[:] = False
+        sizes = self.tableau_sizes.astype(np.intp)
+        face_up = sizes - self.face_down
+        ranks = RANK[tops].astype(np.intp)
+        counts = ranks[:, None, :] - ranks[:, :, None]  # [count, from, to]
+        games, from_piles, to_piles = np.nonzero((counts >= 1) & (counts <= face_up[:, :, None]))
+        counts = counts[games, from_piles, to_piles]
+        bases = self.tableau.reshape(-1)[self.pile_starts[games, from_piles] + sizes[games, from_piles] - counts]
+        fits = KEY[bases] == needs[games, to_piles]
+        mask.reshape(-1)[(games * ACTION_COUNT + ACTION_TABLEAU_TO_TABLEAU + (from_piles * 7 + to_piles) * MAX_RUN +
+                          counts - 1)[fits]] = True
+        # Any face-up run may go to an empty pile
+        games, to_piles = np.nonzero(empty)
+        runs[games, :, to_piles, :] = RUNS <= face_up[games][:, :, None]
+        return mask
+
+    def step(self, actions, mask=None):
+        # Play one action per game. Illegal actions (and -1, "no action") leave their game as it is.
+        # `mask` may be the legal_mask() of the current position, to save working it out again.
+        # Returns a boolean array of which games took their action.
+        actions = np.asarray(actions, np.intp)
+        if mask is None:
+            mask = self.legal_mask()
+        in_range = (actions >= 0) & (actions < ACTION_COUNT)
+        legal = np.zeros(self.count, bool)
+        legal[in_range] = mask[self.rows[in_range], actions[in_range]]
+        actions = np.where(legal, actions, -1)
+
+        games = np.flatnonzero(actions == ACTION_DRAW)
+        if len(games):
+            self.draw(games)
+        games = np.flatnonzero(actions == ACTION_WASTE_TO_FOUNDATION)
+        if len(games):
+            self.push_foundation(games, self.pop_waste(games))
+        games = np.flatnonzero((actions >= ACTION_WASTE_TO_TABLEAU) & (actions < ACTION_TABLEAU_TO_FOUNDATION))
+        if len(games):
+            self.push_tableau(games, actions[games] - ACTION_WASTE_TO_TABLEAU, self.pop_waste(games))
+        games = np.flatnonzero((actions >= ACTION_TABLEAU_TO_FOUNDATION) & (actions < ACTION_FOUNDATION_TO_TABLEAU))
+        if len(games):
+            self.push_foundation(games, self.pop_tableau(games, actions[games] - ACTION_TABLEAU_TO_FOUNDATION))
+        games = np.flatnonzero((actions >= ACTION_FOUNDATION_TO_TABLEAU) & (actions < ACTION_TABLEAU_TO_TABLEAU))
+        if len(games):
+            slots, piles = np.divmod(actions[games] - ACTION_FOUNDATION_TO_TABLEAU, 7)
+            self.push_tableau(games, piles, self.pop_foundation(games, slots))
+        games = np.flatnonzero(actions >= ACTION_TABLEAU_TO_TABLEAU)
+        if len(games):
+            pile_pairs, counts = np.divmod(actions[games] - ACTION_TABLEAU_TO_TABLEAU, MAX_RUN)
+            from_piles, to_piles = np.divmod(pile_pairs, 7)
+            self.move_runs(games, from_piles, to_piles, counts + 1)
+        self.steps[legal] += 1
+        return legal
+
+    def draw(self, games):
+        # Turn up to draw_count cards from the stockpile, or the waste back over once the stockpile is empty
+        stock = self.talon_sizes[games] - self.waste_sizes[games]
+        self.waste_sizes[games] = np.where(stock > 0, self.waste_sizes[games] + np.minimum(self.draw_counts[games], stock),
+                                           0)
+
+    def pop_waste(self, games):
+        # Take the waste top card out of the talon; the stockpile behind it closes the gap
+        tops = self.waste_sizes[games].astype(np.intp) - 1
+        cards = self.talon[games, tops]
+        positions = np.arange(TALON_SIZE)
+        sources = np.minimum(positions + (positions >= tops[:, None]), TALON_SIZE - 1)
+        self.talon[games] = np.take_along_axis(self.talon[games], sources, axis=1)
+        self.talon[games, self.talon_sizes[games] - 1] = EMPTY
+        self.talon_sizes[games] -= 1
+        self.waste_sizes[games] -= 1
+        return cards
+
+    def push_tableau(self, games, piles, cards):
+        sizes = self.tableau_sizes[games, piles]
+        self.tableau[games, piles, sizes] = cards
+        self.tableau_sizes[games, piles] = sizes + 1
+
+    def pop_tableau(self, games, piles):
+        sizes = self.tableau_sizes[games, piles] - 1
+        cards = self.tableau[games, piles, sizes]
+        self.tableau[games, piles, sizes] = EMPTY
+        self.tableau_sizes[games, piles] = sizes
+        self.reveal(games, piles)
+        return cards
+
+    def reveal(self, games, piles):
+        # Turn a pile's new top card face up if it is face down
+        self.face_down[games, piles] = np.minimum(self.face_down[games, piles],
+                                                  np.maximum(self.tableau_sizes[games, piles] - 1, 0))
+
+    def push_foundation(self, games, cards):
+        # A card goes to the slot of its suit; an ace to the first empty slot, as in Game.foundation_slot
+        suits = SUIT[cards]
+        same_suit = self.foundation_suits[games] == suits[:, None]
+        slots = np.where(same_suit.any(axis=1), same_suit.argmax(axis=1),
+                         (self.foundation_sizes[games] == 0).argmax(axis=1))
+        self.foundation_suits[games, slots] = suits
+        self.foundation_sizes[games, slots] += 1
+
+    def pop_foundation(self, games, slots):
+        sizes = self.foundation_sizes[games, slots] - 1
+        suits = self.foundation_suits[games, slots]
+        self.foundation_sizes[games, slots] = sizes
+        self.foundation_suits[games, slots] = np.where(sizes > 0, suits, EMPTY)
+        return (suits * 13 + sizes).astype(np.int8)
+
+    def move_runs(self, games, from_piles, to_piles, counts):
+        # Move the top counts[n] cards of tableau pile from_piles[n] onto to_piles[n], for each games[n]
+        from_sizes = self.tableau_sizes[games, from_piles].astype(np.intp)
+        to_sizes = self.tableau_sizes[games, to_piles].astype(np.intp)
+        moved, offsets = np.nonzero(np.arange(MAX_RUN) < counts[:, None])  # One entry per card carried
+        rows = games[moved]
+        sources = from_sizes[moved] - counts[moved] + offsets
+        self.tableau[rows, to_piles[moved], to_sizes[moved] + offsets] = self.tableau[rows, from_piles[moved], sources]
+        self.tableau[rows, from_piles[moved], sources] = EMPTY
+        self.tableau_sizes[games, from_piles] = from_sizes - counts
+        self.tableau_sizes[games, to_piles] = to_sizes + counts
+        self.reveal(games, from_piles)
+
+    def won(self):
+        return self.foundation_sizes.sum(axis=1) == 52
+
+# Preference of the 'greedy' policy per action: foundation moves first, then tableau moves that
+# turn up a face-down card, cards from the waste, stock draws, other tableau moves, and taking
+# cards back off the foundation last
+GREEDY_WEIGHTS = np.zeros(ACTION_COUNT)
+GREEDY_WEIGHTS[ACTION_WASTE_TO_FOUNDATION] = 4
+GREEDY_WEIGHTS[ACTION_TABLEAU_TO_FOUNDATION:ACTION_FOUNDATION_TO_TABLEAU] = 4
+GREEDY_WEIGHTS[ACTION_WASTE_TO_TABLEAU:ACTION_TABLEAU_TO_FOUNDATION] = 2
+GREEDY_WEIGHTS[ACTION_DRAW] = 1
+GREEDY_WEIGHTS[ACTION_TABLEAU_TO_TABLEAU:] = 0.5
+REVEAL_WEIGHT = 3
+
+def random_weights(batch, games, actions):
+    return 0.0
+
+def greedy_weights(batch, games, actions):
+    weights = GREEDY_WEIGHTS[actions]
+    pile_pairs, counts = np.divmod(actions - ACTION_TABLEAU_TO_TABLEAU, MAX_RUN)
+    from_piles = np.clip(pile_pairs // 7, 0, 6)
+    sizes = batch.tableau_sizes[games, from_piles]
+    face_down = batch.face_down[games, from_piles]
+    reveals = (actions >= ACTION_TABLEAU_TO_TABLEAU) & (face_down > 0) & (counts + 1 == sizes - face_down)
+    weights[reveals] = REVEAL_WEIGHT
+    return weights
+
+# Policies give each legal action of each game a weight (see choose_actions)
+POLICIES = {
+    'random': random_weights,
+    'greedy': greedy_weights,
+}
+
+def choose_actions(batch, mask, rng, policy="random"):
+    # One action per game: the legal action with the highest policy weight, ties broken at random
+    # (so 'random' picks uniformly). Games without a legal action get -1. Only the legal entries of
+    # the mask are scored; there are a few per game against ACTION_COUNT columns.
+    games, actions = np.divmod(np.flatnonzero(mask), ACTION_COUNT)
+    chosen = np.full(len(mask), -1)
+    if len(games) == 0:
+        return chosen
+    scores = POLICIES[policy](batch, games, actions) + rng.random(len(actions))
+    starts = np.flatnonzero(np.diff(games, prepend=-1))  # Each game's entries are consecutive
+    best = np.maximum.reduceat(scores, starts)
+    top = scores == np.repeat(best, np.diff(starts, append=len(scores)))
+    chosen[games[top]] = actions[top]
+    return chosen
+
+def play(seeds, policy="random", draw_count=1, batch_size=4096, max_steps=MAX_STEPS, rng_seed=0):
+    # Play seeded deals with a policy, batch_size games at a time. A game ends when it is won, has
+    # no legal action, goes a whole pass through the stockpile without another move, or reaches
+    # max_steps; its slot is dealt the next seed straight away, so the batch stays full.
+    # Yields (seed, won, moves) for every deal, in the order the games end.
+    seeds = list(seeds)
+    batch = BatchGame(min(batch_size, len(seeds)), draw_count)
+    slot_seeds = seeds[:batch.count]
+    next_seed = batch.count
+    batch.deal(slot_seeds)
+    rng = np.random.default_rng(rng_seed)
+    mask = np.empty((batch.count, ACTION_COUNT), bool)
+    active = np.ones(batch.count, bool)
+    stuck = np.zeros(batch.count, bool)
+    draws_in_a_row = np.zeros(batch.count, np.intp)
+    while active.any():
+        won = batch.won()
+        finished = np.flatnonzero(active & (won | stuck | (draws_in_a_row > TALON_SIZE) | (batch.steps >= max_steps)))
+        if len(finished):
+            for game in finished:
+                yield slot_seeds[game], bool(won[game]), int(batch.steps[game])
+            refill = finished[:len(seeds) - next_seed]
+            for game in refill:
+                slot_seeds[game] = seeds[next_seed]
+                next_seed += 1
+            if len(refill):
+                batch.deal([slot_seeds[game] for game in refill], games=refill)
+            active[finished[len(refill):]] = False
+            stuck[finished] = False
+            draws_in_a_row[finished] = 0
+        batch.legal_mask(out=mask)
+        mask[~active] = False
+        actions = choose_actions(batch, mask, rng, policy)
+        stuck = active & (actions < 0)
+        batch.step(actions, mask)
+        draws_in_a_row = np.where(actions == ACTION_DRAW, draws_in_a_row + 1, 0)
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many seeded deals with the vectorized batch engine.")
+    parser.add_argument("--seed", type=int, default=0, help="deal number of the first deal")
+    parser.add_argument("--deals", type=int, default=10000, help="number of deals to play")
+    parser.add_argument("--batch", type=int, default=4096, help="games stepped together")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy", help="how moves are chosen")
+    parser.add_argument("--draw", type=int, default=1, choices=(1, 3), help="cards turned per stockpile draw")
+    parser.add_argument("--max-steps", type=int, default=MAX_STEPS, help="moves after which a game is cut off")
+    parser.add_argument("--out", default="-", help="JSON lines output file ('-' for stdout, '' for none)")
+    args = parser.parse_args()
+
+    out = sys.stdout if args.out == "-" else (open(args.out, "w") if args.out else None)
+    deals = won = moves = 0
+    start_time = time.perf_counter()
+    for seed, game_won, game_moves in play(range(args.seed, args.seed + args.deals), args.policy, args.draw,
+                                           args.batch, args.max_steps, args.seed):
+        deals += 1
+        won += game_won
+        moves += game_moves
+        if out is not None:
+            out.write(json.dumps({'seed': seed, 'policy': args.policy, 'draw': args.draw, 'moves': game_moves,
+                                  'won': game_won}) + "\n")
+    elapsed = time.perf_counter() - start_time
+    # The report goes to stderr so stdout stays a clean JSON lines stream
+    print(f"{deals} deals in {elapsed:.2f}s = {deals / elapsed:.1f} deals/s, {moves / elapsed:.0f} moves/s, "
+          f"win rate {won / deals:.1%}", file=sys.stderr)
+    if out not in (None, sys.stdout):
+        out.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from classes import Game
+import solver
+
+# Benchmarks for the game engine and the renderer. Every benchmark works on seeded deals and on
+# move scripts made from them by a fixed greedy policy, so two runs on the same code do the
+# same work. Results are written as JSON; pass an earlier result file as --baseline to compare.
+
+SCRIPT_LENGTH = 300  # Most moves taken from a deal for its move script
+DRAW_CYCLES = 20  # Times the whole stockpile is drawn through in the draw benchmark
+
+def move_type(move):
+    # Benchmark name for a move tuple, e.g. 'move.waste_to_tableau'
+    from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+    if from_pile_name == "stock":
+        return "move.draw"
+    return f"move.{from_pile_name}_to_{to_pile_name}"
+
+def build_script(seed, draw_count):
+    # Fixed move script for a deal: the best-ordered move that reaches a new position, as in the greedy policy
+    game = Game(seed, draw_count)
+    seen = {game.canonical_hash()}
+    script = []
+    while len(script) < SCRIPT_LENGTH and not game.check_win():
+        for move in reversed(solver.ordered_moves(game)):  # Best move first
+            game.apply_move(move)
+            if game.canonical_hash() not in seen:
+                break
+            game.undo()
+        else:
+            break  # The policy is stuck
+        seen.add(game.canonical_hash())
+        script.append(move)
+    return script
+
+class Timings:
+    # Per-operation timings, grouped by benchmark name
+    def __init__(self):
+        self.samples = {}  # Name -> list of seconds per operation
+
+    def add(self, name, seconds, operations=1):
+        self.samples.setdefault(name, []).append(seconds / operations)
+
+    def time(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.add(name, time.perf_counter() - start)
+        return result
+
+    def report(self):
+        results = {}
+        for name, samples in sorted(self.samples.items()):
+            results[name] = {
+                'n': len(samples),
+                'mean_us': round(statistics.fmean(samples) * 1e6, 3),
+                'median_us': round(statistics.median(samples) * 1e6, 3),
+                'min_us': round(min(samples) * 1e6, 3),
+                'total_s': round(sum(samples), 6),
+            }
+        return results
+
+def bench_construction(timings, seeds, draw_count):
+    for seed in seeds:
+        timings.time("game.construct", Game, seed, draw_count)
+
+def bench_moves(timings, seeds, scripts, draw_count):
+    # Along each script, try every legal move (timing the move and its undo), then play the script's move
+    for seed in seeds:
+        game = Game(seed, draw_count)
+        for scripted_move in scripts[seed]:
+            timings.time("game.legal_moves", game.legal_moves)
+            timings.time("game.find_hint", game.find_hint)
+            timings.time("game.check_win", game.check_win)
+            for move in game.legal_moves():
+                if timings.time(move_type(move), game.apply_move, move) == "":
+                    timings.time("history.undo", game.undo)
+            game.apply_move(scripted_move)
+
+def bench_history(timings, seeds, scripts, draw_count):
+    # Undo a whole scripted game back to the deal, then redo all of it
+    for seed in seeds:
+        game = Game(seed, draw_count)
+        for move in scripts[seed]:
+            timings.time("history.record", game.apply_move, move)
+        for _ in scripts[seed]:
+            timings.time("history.undo_all", game.undo)
+        for _ in scripts[seed]:
+            timings.time("history.redo_all", game.redo)
+
+def bench_draw_cycle(timings, seeds, draw_count):
+    # Turn the whole stockpile over and over, including the recycles
+    for seed in seeds:
+        game = Game(seed, draw_count)
+        draws = DRAW_CYCLES * ((game.stockpile.cards.size() + draw_count - 1) // draw_count + 1)
+        start = time.perf_counter()
+        for _ in range(draws):
+            game.draw_from_stockpile()
+        timings.add("game.draw_from_stockpile", time.perf_counter() - start, draws)
+
+def bench_render(timings, seeds, scripts, draw_count):
+    # Full-frame and dirty-rectangle render times under the SDL dummy video driver
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    import assets
+    import main
+    from layout import Layout
+    pygame.init()
+    main.screen = pygame.display.set_mode((main.SCREEN_WIDTH, main.SCREEN_HEIGHT))
+    assets.preload(main.IMAGES, main.FONTS)
+    board = assets.get_image(*main.BACKGROUND).convert()
+    for seed in seeds:
+        main.game = Game(seed, draw_count)
+        main.board_layout = Layout(main.game)
+        renderer = main.DirtyRenderer(main.screen, board)
+        renderer.update_scene(main.board_regions())
+        renderer.render()
+        for move in scripts[seed]:
+            main.game.apply_move(move)
+            # Dirty-rectangle frame: only the piles the move touched are drawn again
+            start = time.perf_counter()
+            renderer.update_scene(main.board_regions())
+            renderer.render()
+            timings.add("render.dirty_frame", time.perf_counter() - start)
+            # Full frame: the whole board drawn from scratch, as before the dirty-rectangle renderer
+            start = time.perf_counter()
+            main.screen.blit(board, (0, 0))
+            timings.time("render.draw_tableau", main.draw_tableau)
+            timings.time("render.draw_foundation", main.draw_foundation)
+            timings.time("render.draw_stockpile", main.draw_stockpile)
+            pygame.display.flip()
+            timings.add("render.full_frame", time.perf_counter() - start)
+    pygame.quit()
+
+BENCHMARKS = {
+    'construct': lambda timings, seeds, scripts, draw_count: bench_construction(timings, seeds, draw_count),
+    'moves': bench_moves,
+    'history': bench_history,
+    'draw': lambda timings, seeds, scripts, draw_count: bench_draw_cycle(timings, seeds, draw_count),
+    'render': bench_render,
+}
+
+def run(first_seed, deals, draw_count, selected, repeat):
+    seeds = range(first_seed, first_seed + deals)
+    scripts = {seed: build_script(seed, draw_count) for seed in seeds}
+    timings = Timings()
+    for _ in range(repeat):
+        for name in selected:
+            BENCHMARKS[name](timings, seeds, scripts, draw_count)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'first_seed': first_seed,
+            'deals': deals,
+            'draw': draw_count,
+            'repeat': repeat,
+            'script_moves': sum(len(script) for script in scripts.values()),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        'results': timings.report(),
+    }
+
+def compare(results, baseline, out):
+    # Print median time per benchmark against a baseline run (ratio < 1 means faster now)
+    for name, result in results['results'].items():
+        before = baseline['results'].get(name)
+        if before is None or not before['median_us']:
+            print(f"{name:32} {result['median_us']:12.3f} us   (new)", file=out)
+        else:
+            ratio = result['median_us'] / before['median_us']
+            print(f"{name:32} {result['median_us']:12.3f} us   was {before['median_us']:12.3f} us   x{ratio:.2f}",
+                  file=out)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the game engine and renderer on seeded deals.")
+    parser.add_argument("--seed", type=int, default=0, help="deal number of the first deal")
+    parser.add_argument("--deals", type=int, default=20, help="number of deals to benchmark on")
+    parser.add_argument("--draw", type=int, default=1, choices=(1, 3), help="cards turned per stockpile draw")
+    parser.add_argument("--repeat", type=int, default=3, help="times every benchmark is run")
+    parser.add_argument("--only", default=",".join(BENCHMARKS),
+                        help=f"comma list of benchmarks to run ({', '.join(BENCHMARKS)})")
+    parser.add_argument("--out", default="-", help="JSON output file ('-' for stdout)")
+    parser.add_argument("--baseline", default=None, help="earlier JSON output to compare against")
+    args = parser.parse_args()
+
+    selected = [name for name in args.only.split(",") if name]
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    results = run(args.seed, args.deals, args.draw, selected, args.repeat)
+    text = json.dumps(results, indent=2)
+    if args.out == "-":
+        print(text)
+    else:
+        with open(args.out, "w") as out:
+            out.write(text + "\n")
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        compare(results, baseline, sys.stderr)  # The comparison goes to stderr so stdout stays valid JSON
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,104 @@
+import os
 import random
-import pygame
+import threading
+import debug_log
+from debug_log import logger
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))  # Folder that holds the cards/ and images/ folders
+CARD_SIZE = (85, 125)  # Size every card image is scaled to
+
+SUITS = ['Hearts', 'Diamonds', 'Clubs', 'Spades']  # Suits in card-code order
+RANKS = ['Ace' , '2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen', 'King']  # Ranks in card-code order
+SUIT_IDS = {suit: i for i, suit in enumerate(SUITS)}  # Suit name -> 0..3
+RANK_VALUES = {rank: i for i, rank in enumerate(RANKS)}  # Rank name -> 0 (Ace) .. 12 (King)
+SUIT_COLORS = (0, 0, 1, 1)  # Color of each suit id: 0 = red, 1 = black
+OPPOSITE_SUITS = tuple(tuple(suit for suit in range(4) if SUIT_COLORS[suit] != color) for color in (0, 1))  # Color -> suit ids
+
+# Compact card form: every card is also an int code 0..51 (suit_id * 13 + rank_value).
+# These tables are indexed by code so color and rank checks are single lookups.
+CODE_RANK = tuple(code % 13 for code in range(52))
+CODE_SUIT = tuple(code // 13 for code in range(52))
+CODE_COLOR = tuple(SUIT_COLORS[code // 13] for code in range(52))
+# CAN_STACK[a][b] is True when card a may be placed on card b in the tableau
+CAN_STACK = tuple(tuple(CODE_COLOR[a] != CODE_COLOR[b] and CODE_RANK[a] == CODE_RANK[b] - 1 for b in range(52))
+                  for a in range(52))
+
+def card_from_code(code, face_up=True):
+    # Build a Card object back from its int code
+    return Card(SUITS[CODE_SUIT[code]], RANKS[CODE_RANK[code]], face_up)
+
+DEAL_BYTES = 29  # 52! < 2**226, so any deck order fits in 29 bytes
+
+def encode_deal(codes):
+    # Pack a deck order (52 card codes) into DEAL_BYTES bytes using its Lehmer code (rank of the permutation)
+    remaining = list(range(52))
+    number = 0
+    for code in codes:
+        index = remaining.index(code)
+        number = number * len(remaining) + index
+        remaining.pop(index)
+    return number.to_bytes(DEAL_BYTES, "big")
+
+def decode_deal(data):
+    # Unpack bytes made by encode_deal back into the list of 52 card codes
+    number = int.from_bytes(data, "big")
+    indices = []
+    for base in range(1, 53):  # Peel the mixed-radix digits off from the last card to the first
+        number, index = divmod(number, base)
+        indices.append(index)
+    remaining = list(range(52))
+    return [remaining.pop(index) for index in reversed(indices)]
+
+# Process-wide cache of card images keyed by (rank, suit, size), shared by every Card of every Game
+card_sprites = {}
+
+def get_card_sprite(rank, suit, size=CARD_SIZE):
+    # Return the cached image for a card, loading and scaling it the first time it is asked for
+    key = (rank, suit, size)
+    sprite = card_sprites.get(key)
+    if sprite is None:
+        sprite = load_card_sprite(rank, suit, size)
+        card_sprites[key] = sprite
+    return sprite
+
+def load_card_sprite(rank, suit, size):
+    # Read the card image from disk once, scale it and convert it to the display format.
+    # Off the main thread (the background asset load) it is only decoded and scaled; the loader
+    # converts it on the main thread afterwards (assets.convert_pending).
+    # pygame is imported here so headless code (solver, simulations) never needs it.
+    import pygame
+    path = os.path.join(ASSET_DIR, "cards", f"{rank}_of_{suit}.png".lower())
+    try:
+        image = pygame.image.load(path)
+        image = pygame.transform.scale(image, size)
+        if pygame.display.get_init() and pygame.display.get_surface() is not None and \
+                threading.current_thread() is threading.main_thread():
+            image = image.convert_alpha()  # Match the screen format so blits are fast
+        return image
+    except pygame.error:
+        # If an error occurs (e.g., file not found), use a placeholder image
+        logger.warning("Error loading image for %s of %s", rank, suit)
+        placeholder_image = pygame.Surface(size)  # Create a blank white surface
+        placeholder_image.fill((255, 255, 255))  # Fill the placeholder with white color
+        return placeholder_image
 
 class Card:
+    __slots__ = ('suit', 'rank', 'face_up', 'rank_value', 'suit_id', 'color', 'code')
+
     # Initialize the Card object with suit, rank, and face_up status
     def __init__(self, suit, rank, face_up=True):
         self.suit = suit  # Suit of the card (e.g., hearts, spades)
         self.rank = rank  # Rank of the card (e.g., Ace, 2, King)
         self.face_up = face_up  # Whether the card is face up or face down
-        self.card_image_path = f"C:/Users/3 Stars Laptop/Desktop/Game/cards/{rank}_of_{suit}.png"  # Path to card image
-        self.card_image = self.load_image()  # Load the image for the card
-
-    # Method to load the card image
-    def load_image(self):
-        try:
-            # Try to load the image file
-            image = pygame.image.load(self.card_image_path)
-            image = pygame.transform.scale(image, (85, 125))  # Resize image to 80x125
-            return image
-        except pygame.error:
-            # If an error occurs (e.g., file not found), use a placeholder image
-            print(f"Error loading image for {self.rank} of {self.suit}")
-            placeholder_image = pygame.Surface((80, 125))  # Create a blank white surface
-            placeholder_image.fill((255, 255, 255))  # Fill the placeholder with white color
-            return placeholder_image
+        self.rank_value = RANK_VALUES[rank]  # 0 (Ace) .. 12 (King), cached for rank comparisons
+        self.suit_id = SUIT_IDS[suit]  # 0..3, cached for suit comparisons
+        self.color = SUIT_COLORS[self.suit_id]  # 0 = red, 1 = black
+        self.code = self.suit_id * 13 + self.rank_value  # Compact int form of the card (0..51)
+
+    # The card image is looked up in the shared sprite cache, so it is only loaded when first drawn
+    @property
+    def card_image(self):
+        return get_card_sprite(self.rank, self.suit)
     # Method to flip the card (change its face-up/face-down status)
     def flip(self):
         self.face_up = not self.face_up
@@ -31,13 +107,23 @@ class Card:
         return f"{'Face Up' if self.face_up else 'Face Down'}: {self.rank}{self.suit}"
 
 class Deck:
-    suits = ['Hearts', 'Diamonds', 'Clubs', 'Spades']  # List of card suits
-    ranks = ['Ace' , '2', '3', '4', '5', '6', '7', '8', '9', '10', 'Jack', 'Queen', 'King']  # List of card ranks
-    def __init__(self):
-        self.cards = [Card(suit, rank) for suit in self.suits for rank in self.ranks]  # Create the deck of cards
-        self.shuffle()
+    suits = SUITS  # List of card suits
+    ranks = RANKS  # List of card ranks
+    def __init__(self, seed=None, order=None):
+        self.rng = random.Random(seed)  # Private generator, so a seed always gives the same deal
+        if order is not None:
+            self.cards = [card_from_code(code) for code in order]  # Rebuild a stored deal, no shuffle
+        else:
+            self.cards = [Card(suit, rank) for suit in self.suits for rank in self.ranks]  # Create the deck of cards
+            self.shuffle()
     def shuffle(self):
-        random.shuffle(self.cards)  # Shuffle the deck
+        # Fisher-Yates with the deck's own generator, so a seed deals the same cards on every machine
+        cards = self.cards
+        for i in range(len(cards) - 1, 0, -1):
+            j = self.rng.randrange(i + 1)
+            cards[i], cards[j] = cards[j], cards[i]
+    def codes(self):
+        return [card.code for card in self.cards]  # Current deck order as card codes
     def draw_card(self, count=1):
         drawn_cards = []
         for _ in range(count):
@@ -52,16 +138,19 @@ class Deck:
 class Tableau:
     def __init__(self):
         self.piles = {i: LinkedList() for i in range(7)}  # Initialize 7 piles as LinkedLists
-    def reveal_bottom_face_down(self):
-        for i, pile in self.piles.items():
+    def reveal_bottom_face_down(self, pile_indices=None):
+        # Flip the last card of each pile if it is face down; only the given piles are checked when passed
+        revealed = []
+        for i in (self.piles if pile_indices is None else pile_indices):
+            pile = self.piles[i]
             if not pile.is_empty():
-                current_node = pile.head
-                while current_node.next is not None:
-                    current_node = current_node.next
-                last_card = current_node.data
+                last_card = pile.get_last()
                 if not last_card.face_up:
                     last_card.flip()  # Flip the bottom face-down card
-                    print(f"Revealed bottom face-down card in Pile {i + 1}: {last_card}")
+                    revealed.append(i)
+                    if debug_log.enabled:
+                        logger.debug("Revealed bottom face-down card in Pile %d: %s", i + 1, last_card)
+        return revealed  # Indices of the piles whose bottom card was flipped
     def add_card_to_pile(self, pile_index, card):
         if pile_index in self.piles:
             self.piles[pile_index].insert_at_tail(card)  # Add card to the specified pile
@@ -94,7 +183,7 @@ class waste_pile:
     def display(self):
         return self.cards.display()  # Display all cards in the waste pile
     def __str__(self):
-        return ', '.join(str(card) for card in self.cards)  # String representation of the waste pile
+        return ', '.join(str(card) for card in self.cards.display())  # String representation of the waste pile
     
 class stockpile:
     def __init__(self):
@@ -110,18 +199,154 @@ class stockpile:
     def display(self):
         return self.cards.display()  # Display all cards in the stockpile
     def __str__(self):
-        return ', '.join(str(card) for card in self.cards)  # String representation of the stockpile
+        return ', '.join(str(card) for card in self.cards.display())  # String representation of the stockpile
         
-class Game:
+# Zobrist keys: one random 64-bit number per (card, place) so a whole board hashes to the XOR of its parts.
+# The generator is seeded so every run and every machine gets the same keys.
+HASH_MASK = (1 << 64) - 1
+MAX_PILE_DEPTH = 20  # 6 face-down cards + a 13-card run fit in a tableau pile
+_zobrist_rng = random.Random(0x5EED5011)
+ZOBRIST_TABLEAU = [[(_zobrist_rng.getrandbits(64), _zobrist_rng.getrandbits(64)) for _ in range(MAX_PILE_DEPTH)]
+                   for _ in range(52)]  # [code][depth in pile][face_up]
+ZOBRIST_PILE = [_zobrist_rng.getrandbits(64) for _ in range(7)]  # Salt that ties a pile hash to its column
+ZOBRIST_FOUNDATION = [[_zobrist_rng.getrandbits(64) for _ in range(52)] for _ in range(4)]  # [slot][code]
+ZOBRIST_FOUNDATION_ANY = [_zobrist_rng.getrandbits(64) for _ in range(52)]  # [code], ignores the slot
+ZOBRIST_STOCK = [_zobrist_rng.getrandbits(64) for _ in range(52)]  # [code] card is in the stockpile
+ZOBRIST_WASTE = [_zobrist_rng.getrandbits(64) for _ in range(52)]  # [code] card is in the waste pile
+
+def mix64(value):
+    # splitmix64 finaliser; turns a pile hash into a well-spread value before piles are combined
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & HASH_MASK
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & HASH_MASK
+    return value ^ (value >> 31)
+
+# Move priorities used to order hints and search (lower is tried first)
+FOUNDATION_PRIORITY = 0  # Card to foundation
+REVEAL_PRIORITY = 1  # Tableau run moved off a face-down card
+WASTE_PRIORITY = 2  # Waste card to tableau
+TABLEAU_PRIORITY = 3  # Any other tableau-to-tableau move
+DRAW_PRIORITY = 4  # Turn cards from the stockpile
+FROM_FOUNDATION_PRIORITY = 5  # Foundation card back to tableau (rarely needed, tried last)
+
+DRAW_MOVE = ('stock', 0, 'waste', 0, 1)  # Move tuple for a stockpile draw (or waste recycle)
+
+class ZobristHash:
+    # Incrementally maintained 64-bit hash of a Game board.
+    # Each tableau pile has its own hash that does not depend on the column. Piles are combined
+    # twice: XORed with a per-column salt for the exact hash, and added up for the canonical
+    # hash (addition does not care about column order). The foundation has a per-slot part and a
+    # slot-free part. The stockpile/waste cards always keep the order they were dealt in, so
+    # which cards are in each of them is enough to know their order.
     def __init__(self):
-        self.deck = Deck()  # Initialize the deck of cards
+        self.pile_hash = [0] * 7
+        self.tableau_exact = 0
+        self.tableau_canonical = 0
+        for i in range(7):
+            self.tableau_exact ^= mix64(ZOBRIST_PILE[i])
+            self.tableau_canonical = (self.tableau_canonical + mix64(0)) & HASH_MASK
+        self.foundation_exact = 0
+        self.foundation_canonical = 0
+        # Stock and waste keep both key sets so a recycle (all waste -> stock) is O(1)
+        self.stock_keys = 0  # XOR of ZOBRIST_STOCK over stock cards
+        self.stock_waste_keys = 0  # XOR of ZOBRIST_WASTE over stock cards
+        self.waste_keys = 0  # XOR of ZOBRIST_WASTE over waste cards
+        self.waste_stock_keys = 0  # XOR of ZOBRIST_STOCK over waste cards
+
+    def exact(self):
+        # Hash of the exact board, including column and foundation slot order
+        return self.tableau_exact ^ self.foundation_exact ^ self.stock_keys ^ self.waste_keys
+
+    def canonical(self):
+        # Hash that is the same for boards that only differ in column or foundation slot order
+        return self.tableau_canonical ^ self.foundation_canonical ^ self.stock_keys ^ self.waste_keys
+
+    def set_pile(self, index, new_hash):
+        # Replace the hash of one tableau pile and update both combined tableau hashes in O(1)
+        old_hash = self.pile_hash[index]
+        self.tableau_exact ^= mix64(old_hash ^ ZOBRIST_PILE[index]) ^ mix64(new_hash ^ ZOBRIST_PILE[index])
+        self.tableau_canonical = (self.tableau_canonical - mix64(old_hash) + mix64(new_hash)) & HASH_MASK
+        self.pile_hash[index] = new_hash
+
+    def toggle_tableau(self, index, cards, start):
+        # Add or remove (XOR is its own inverse) cards lying at depth start, start + 1, ... of a pile
+        pile_hash = self.pile_hash[index]
+        for depth, card in enumerate(cards, start):
+            pile_hash ^= ZOBRIST_TABLEAU[card.code][depth][card.face_up]
+        self.set_pile(index, pile_hash)
+
+    def flip_tableau(self, index, card, depth):
+        # A tableau card changed its face-up state
+        keys = ZOBRIST_TABLEAU[card.code][depth]
+        self.set_pile(index, self.pile_hash[index] ^ keys[0] ^ keys[1])
+
+    def toggle_foundation(self, slot, card):
+        # Add or remove a card on a foundation slot
+        self.foundation_exact ^= ZOBRIST_FOUNDATION[slot][card.code]
+        self.foundation_canonical ^= ZOBRIST_FOUNDATION_ANY[card.code]
+
+    def toggle_stock(self, card):
+        # Add or remove a card in the stockpile
+        self.stock_keys ^= ZOBRIST_STOCK[card.code]
+        self.stock_waste_keys ^= ZOBRIST_WASTE[card.code]
+
+    def toggle_waste(self, card):
+        # Add or remove a card in the waste pile
+        self.waste_keys ^= ZOBRIST_WASTE[card.code]
+        self.waste_stock_keys ^= ZOBRIST_STOCK[card.code]
+
+    def recycle(self):
+        # Every waste card moved into the (empty) stockpile
+        self.stock_keys, self.stock_waste_keys = self.waste_stock_keys, self.waste_keys
+        self.waste_keys = self.waste_stock_keys = 0
+
+    def unrecycle(self):
+        # Every stockpile card moved back onto the (empty) waste pile
+        self.waste_keys, self.waste_stock_keys = self.stock_waste_keys, self.stock_keys
+        self.stock_keys = self.stock_waste_keys = 0
+
+    def reset(self, game):
+        # Recompute everything from scratch for the current board of `game`
+        self.__init__()
+        for i, pile in game.tableau.piles.items():
+            self.toggle_tableau(i, pile.display(), 0)
+        for slot, pile in enumerate(game.foundation.piles):
+            for card in pile.display():
+                self.toggle_foundation(slot, card)
+        for card in game.stockpile.display():
+            self.toggle_stock(card)
+        for card in game.waste_pile.display():
+            self.toggle_waste(card)
+
+class Game:
+    def __init__(self, seed=None, draw_count=1, deal=None, position=None):
+        # A game is dealt from a deal number (seed), or from bytes made by encode_deal.
+        # Without either, a random deal number is picked so the game can still be replayed later.
+        # With `position` (the set_position arguments) nothing is dealt: the game starts in that
+        # position, and `deal` must be the bytes of the deal it came from (used to load saves).
+        if seed is None and deal is None:
+            seed = random.randrange(2 ** 32)
+        self.seed = seed  # Deal number (None when dealt from bytes)
+        self.draw_count = draw_count  # Cards turned per stockpile draw: 1 (draw-1) or 3 (draw-3)
         self.tableau = Tableau()  # Initialize the tableau piles
         self.foundation = Foundation()  # Initialize the foundation piles
         self.stockpile = stockpile()  # Initialize the stockpile
         self.waste_pile = waste_pile()  # Initialize the waste pile
-        self.move_history = Stack()  # Stack to store move history
+        self.move_history = Stack()  # Stack of move deltas for undo
+        self.redo_history = Stack()  # Stack of undone move deltas for redo
         self.card_tracking = {}  # Dictionary to track card positions
         self.hint = None  # Placeholder for hint functionality
+        self.pile_move_cache = [[] for _ in range(7)]  # Movable runs per tableau pile, see legal_moves
+        self.dirty_piles = set(range(7))  # Tableau piles whose cache entry must be rebuilt
+        self.suit_heights = [0] * 4  # Cards of each suit on the foundation, kept up to date by add/remove_top_card
+        self.face_down_cards = 0  # Face-down tableau cards, kept up to date by reveals and flips
+        self.zobrist = ZobristHash()  # Incremental board hash, kept up to date by every move below
+        if position is not None:
+            self.deck = None  # No cards are dealt
+            self.deal = deal
+            self.set_position(*position)
+            return
+        self.deck = Deck(seed, None if deal is None else decode_deal(deal))  # Initialize the deck of cards
+        self.deal = encode_deal(self.deck.codes())  # Compact form of the deal, enough to rebuild this game
         for i in range(7):  # Initialize the tableau piles
             pile_cards = []
             for j in range(i + 1):
@@ -129,21 +354,24 @@ class Game:
                 card.face_up = False  # Cards are face down initially
                 pile_cards.append(card)
             pile_cards[-1].face_up = True  # Flip the last card face up
+            self.face_down_cards += i
             for card in pile_cards:
                 self.tableau.add_card_to_pile(i, card)  # Add cards to tableau
-                self.card_tracking[str(card)] = [("Tableau", i)]  # Track card position
+                self.card_tracking[card.code] = [("Tableau", i)]  # Track card position
         self.initialize_stockpile()  # Initialize the stockpile with remaining cards
-        self.log_tableau_state()  # Log the initial state of the tableau
+        self.zobrist.reset(self)
+        if debug_log.enabled:
+            self.log_tableau_state()  # Log the initial state of the tableau
 
     def move_cards(self, from_pile_name: str, from_index: int, to_index: int, to_pile_name: str, num_cards: int):
         if from_pile_name == "waste" and to_pile_name == "tableau":  # Move from waste to tableau
             if not self.waste_pile.is_empty():
                 cards_to_move = self.waste_pile.top_card()  # top card from waste
                 if self.is_move_valid(cards_to_move, to_index):  # Validate the move
-                    self.save_state()  # Save the current state for undo functionality
-                    print(self.waste_pile.remove_card())  # Remove card from waste
-                    self.tableau.add_card_to_pile(to_index, cards_to_move)  # Move card to tableau
-                    print(f"Moved {num_cards} card(s) from Waste to Tableau pile {to_index}.")
+                    self.transfer_cards("waste", from_index, to_index, "tableau", 1)  # Move card from waste to tableau
+                    self.record_move("waste", from_index, to_index, "tableau", 1)  # Remember the move for undo
+                    if debug_log.enabled:
+                        logger.debug("Moved %d card(s) from Waste to Tableau pile %d.", num_cards, to_index)
                 else:
                     return "Invalid move to tableau pile."
             else:
@@ -156,46 +384,57 @@ class Game:
                 if not from_pile.is_empty():
                     top_card = from_pile.get_last()  # Get the top card of the tableau pile
                     destination_pile = self.foundation.piles[to_index]
-                    if (destination_pile.is_empty() and top_card.rank == 'Ace') or \
-                    (not destination_pile.is_empty() and top_card.suit == destination_pile.peek().suit and
+                    if (destination_pile.is_empty() and top_card.rank_value == 0) or \
+                    (not destination_pile.is_empty() and top_card.suit_id == destination_pile.peek().suit_id and
                         self.is_one_rank_lower(destination_pile.peek(), top_card)):  # Validate the move to foundation
-                        self.save_state()  # Save the current state for undo functionality
-                        from_pile.remove_tail()  # Remove card from tableau
-                        destination_pile.push(top_card)  # Add card to foundation
-                        print(f"Moved card from Tableau pile {from_index} to Foundation pile {to_index}.")
-                        self.tableau.reveal_bottom_face_down()  # Reveal bottom card in tableau
+                        self.transfer_cards("tableau", from_index, to_index, "foundation", 1)  # Move card to foundation
+                        if debug_log.enabled:
+                            logger.debug("Moved card from Tableau pile %d to Foundation pile %d.", from_index, to_index)
+                        flipped = self.reveal_bottom_face_down(from_index)  # Reveal bottom card in tableau
+                        self.record_move("tableau", from_index, to_index, "foundation", 1, flipped)
                     else:
                         return "Invalid move to foundation pile from tableau."
+                else:
+                    return "Tableau pile is empty, cannot move."
         elif from_pile_name == "tableau" and to_pile_name == "tableau":  # Move from tableau to tableau
             source_pile = self.tableau.piles[from_index]
-            if not source_pile.is_empty():
+            if not 0 < num_cards <= source_pile.size():
+                return "Tableau pile does not have that many cards."
+            else:
                 source_pile_size = source_pile.size()
                 check_card = source_pile.get_node_at_index(source_pile_size - num_cards )
-                print(check_card)
-                if self.is_move_valid(check_card, to_index): 
-                    print("valid move")
-                    self.save_state()  # Validate the move
-                    cards_to_move = [source_pile.remove_tail() for _ in range(num_cards)]  # Remove cards from source tableau
-                    cards_to_move.reverse()
-                    for card in cards_to_move:
-                        self.tableau.add_card_to_pile(to_index, card)  # Move cards to target tableau
-                    print(f"Moved {num_cards} card(s) from Tableau pile {from_index} to Tableau pile {to_index}.")
-                    self.tableau.reveal_bottom_face_down()  # Reveal bottom card in tableau
+                if check_card.face_up and self.is_move_valid(check_card, to_index):  # Only face-up runs can move
+                    self.transfer_cards("tableau", from_index, to_index, "tableau", num_cards)  # Move the run between piles
+                    if debug_log.enabled:
+                        logger.debug("Moved %d card(s) from Tableau pile %d to Tableau pile %d.", num_cards, from_index,
+                                     to_index)
+                    flipped = self.reveal_bottom_face_down(from_index)  # Reveal bottom card in tableau
+                    self.record_move("tableau", from_index, to_index, "tableau", num_cards, flipped)
                 else:
                     return "Invalid move to target tableau pile."
+        elif from_pile_name == "foundation" and to_pile_name == "tableau":  # Move from foundation back to tableau
+            from_pile = self.foundation.piles[from_index]
+            if not from_pile.is_empty():
+                if self.is_move_valid(from_pile.peek(), to_index):
+                    self.transfer_cards("foundation", from_index, to_index, "tableau", 1)  # Move card to tableau
+                    self.record_move("foundation", from_index, to_index, "tableau", 1)  # Remember the move for undo
+                    if debug_log.enabled:
+                        logger.debug("Moved card from Foundation pile %d to Tableau pile %d.", from_index, to_index)
+                else:
+                    return "Invalid move to tableau pile from foundation."
+            else:
+                return "Foundation pile is empty, cannot move."
         elif from_pile_name == "waste" and to_pile_name == "foundation":  # Move from waste to foundation
             if not self.waste_pile.is_empty():
                 card_move = self.waste_pile.top_card()  # Get the top card from the waste
-                print(card_move , " cards to move 1")
                 destination_pile = self.foundation.piles[to_index]
-                if (destination_pile.is_empty() and card_move.rank == 'Ace') or \
-                    (not destination_pile.is_empty() and card_move.suit == destination_pile.peek().suit and
+                if (destination_pile.is_empty() and card_move.rank_value == 0) or \
+                    (not destination_pile.is_empty() and card_move.suit_id == destination_pile.peek().suit_id and
                     self.is_one_rank_lower(destination_pile.peek(), card_move)): 
-                    self.save_state() # Validate the move to foundation
-                    move_card = self.waste_pile.remove_card()  # Remove card from waste pile
-                    print(move_card , " cards to move")
-                    destination_pile.push(move_card)  # Add card to foundation pile
-                    print(f"Moved card from Waste to Foundation pile {to_index}.")
+                    self.transfer_cards("waste", from_index, to_index, "foundation", 1)  # Move card to foundation pile
+                    self.record_move("waste", from_index, to_index, "foundation", 1)  # Remember the move for undo
+                    if debug_log.enabled:
+                        logger.debug("Moved card from Waste to Foundation pile %d.", to_index)
                 else:
                     return "Invalid move to foundation pile from waste."
             else:
@@ -204,63 +443,215 @@ class Game:
             return "Unsupported move type or invalid pile names."
         return ""  # Return empty string if the move is valid
 
+    def apply_move(self, move):
+        # Play a move given as (from_pile_name, from_index, to_pile_name, to_index, num_cards), the same
+        # tuple format as self.hint. A move from 'stock' draws from the stockpile. Returns "" if it was made.
+        from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+        if from_pile_name == "stock":
+            if self.stockpile.is_empty() and self.waste_pile.is_empty():
+                return "Stockpile and waste pile are empty."
+            self.draw_from_stockpile()
+            return ""
+        return self.move_cards(from_pile_name, from_index, to_index, to_pile_name, num_cards)
+
+    def legal_moves(self):
+        # Return every legal move in one pass, as move tuples (see apply_move).
+        # Each tableau pile's movable runs are cached and only re-scanned for piles a move touched.
+        for i in self.dirty_piles:
+            self.pile_move_cache[i] = self.scan_pile(i)
+        self.dirty_piles.clear()
+        # Index what each pile top accepts: (rank_value, color) of a card that may go on it -> piles
+        accepts = {}
+        empty_piles = []
+        for i, pile in self.tableau.piles.items():
+            if pile.is_empty():
+                empty_piles.append(i)
+            else:
+                top = pile.get_last()
+                if top.face_up and top.rank_value > 0:
+                    accepts.setdefault((top.rank_value - 1, 1 - top.color), []).append(i)
+        moves = []
+        for i, runs in enumerate(self.pile_move_cache):
+            if runs:
+                slot = self.foundation_slot(runs[0][1])  # Only the top card may go to the foundation
+                if slot is not None:
+                    moves.append(('tableau', i, 'foundation', slot, 1))
+            for num_cards, card in runs:
+                for j in accepts.get((card.rank_value, card.color), ()):
+                    moves.append(('tableau', i, 'tableau', j, num_cards))
+                for j in empty_piles:
+                    moves.append(('tableau', i, 'tableau', j, num_cards))
+        if not self.waste_pile.is_empty():
+            card = self.waste_pile.top_card()
+            slot = self.foundation_slot(card)
+            if slot is not None:
+                moves.append(('waste', 0, 'foundation', slot, 1))
+            for j in accepts.get((card.rank_value, card.color), []) + empty_piles:
+                moves.append(('waste', 0, 'tableau', j, 1))
+        for slot, pile in enumerate(self.foundation.piles):
+            if not pile.is_empty():
+                card = pile.peek()
+                for j in accepts.get((card.rank_value, card.color), []) + empty_piles:
+                    moves.append(('foundation', slot, 'tableau', j, 1))
+        if not self.stockpile.is_empty() or not self.waste_pile.is_empty():
+            moves.append(DRAW_MOVE)
+        return moves
+
+    def scan_pile(self, pile_index):
+        # Movable runs of a tableau pile as (num_cards, base card), top card first.
+        # Face-up cards sit at the end of a pile, so this walks back from the tail only over them.
+        runs = []
+        node = self.tableau.piles[pile_index].tail
+        while node is not None and node.data.face_up:
+            runs.append((len(runs) + 1, node.data))
+            node = node.prev
+        return runs
+
+    def foundation_slot(self, card):
+        # Foundation slot the card can be played on, or None
+        for slot, pile in enumerate(self.foundation.piles):
+            if pile.is_empty():
+                if card.rank_value == 0:
+                    return slot  # An ace goes to the first empty slot
+            else:
+                top = pile.peek()
+                if top.suit_id == card.suit_id and top.rank_value == card.rank_value - 1:
+                    return slot
+        return None
+
+    def move_priority(self, move):
+        # How promising a move is (lower is better); used to order hints and search
+        from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+        if to_pile_name == "foundation":
+            return FOUNDATION_PRIORITY
+        if from_pile_name == "tableau":
+            face_up = len(self.pile_move_cache[from_index])
+            if num_cards == face_up and self.tableau.piles[from_index].size() > num_cards:
+                return REVEAL_PRIORITY  # Moves the whole face-up run off a face-down card
+            return TABLEAU_PRIORITY
+        if from_pile_name == "waste":
+            return WASTE_PRIORITY
+        if from_pile_name == "foundation":
+            return FROM_FOUNDATION_PRIORITY
+        return DRAW_PRIORITY
+
     def find_hint(self):
-        # Loop through each tableau pile to find a valid move
-        for tableau_idx, tableau_pile in self.tableau.piles.items():
-            if not tableau_pile.is_empty():  # Check if the tableau pile is not empty
-                top_card = tableau_pile.display()[-1]  # Get the top card of the tableau pile
-                # Check if the card can be moved to a foundation pile
-                for foundation_idx, foundation_pile in enumerate(self.foundation.piles):
-                    if (foundation_pile.is_empty() and top_card.rank == 'Ace') or \
-                            (not foundation_pile.is_empty() and top_card.suit == foundation_pile.peek().suit and
-                            self.is_one_rank_lower(top_card, foundation_pile.peek())):
-                        # Valid move to foundation found, set hint and return
-                        self.hint = ('tableau', tableau_idx, 'foundation', foundation_idx, 1)
-                        return
-                # Check if the card can be moved to another tableau pile
-                for other_tableau_idx, other_tableau_pile in self.tableau.piles.items():
-                    if other_tableau_idx != tableau_idx and self.is_move_valid(top_card, other_tableau_idx):
-                        # Valid move to another tableau pile found, set hint and return
-                        self.hint = ('tableau', tableau_idx, 'tableau', other_tableau_idx, 1)
-                        return
-        # If there are no valid moves in tableau piles, check the waste pile
+        # Set self.hint to the most promising legal move (stock draws are not hinted), or None
+        moves = [move for move in self.legal_moves() if move[0] != "stock"]
+        self.hint = min(moves, key=self.move_priority) if moves else None
+        return self.hint
+
+    def safe_to_play(self, suit_id, rank_value):
+        # True when the card can never be needed on the tableau again: an ace, or a card whose two
+        # opposite-color cards one rank lower are already on the foundation
+        if rank_value == 0:
+            return True
+        heights = self.suit_heights
+        other, another = OPPOSITE_SUITS[SUIT_COLORS[suit_id]]
+        return heights[other] >= rank_value and heights[another] >= rank_value
+
+    def next_safe_move(self):
+        # A safe foundation move (see safe_to_play), or None. The candidates come from the foundation:
+        # the next card of each suit, if it would be safe there; only then are the pile tops looked at.
+        wanted = set()
+        for suit_id, height in enumerate(self.suit_heights):
+            if height < 13 and self.safe_to_play(suit_id, height):
+                wanted.add(suit_id * 13 + height)
+        if not wanted:
+            return None
+        for i, pile in self.tableau.piles.items():
+            if not pile.is_empty():
+                card = pile.get_last()
+                if card.face_up and card.code in wanted:
+                    return ('tableau', i, 'foundation', self.foundation_slot(card), 1)
+        if not self.waste_pile.is_empty() and self.waste_pile.top_card().code in wanted:
+            return ('waste', 0, 'foundation', self.foundation_slot(self.waste_pile.top_card()), 1)
+        return None
+
+    def auto_play(self):
+        # Play safe foundation moves until there are none left; returns them. Each is an ordinary
+        # move in the history, so undo takes them back one at a time.
+        moves = []
+        move = self.next_safe_move()
+        while move is not None:
+            self.apply_move(move)
+            moves.append(move)
+            move = self.next_safe_move()
+        return moves
+
+    def can_finish(self):
+        # True when every tableau card is face up and the game is not won yet. The rest of the game
+        # then needs no choices: finish_game() plays it out, drawing through the stockpile if cards
+        # are left there or in the waste pile.
+        return self.face_down_cards == 0 and not self.check_win()
+
+    def finish_game(self):
+        # Play out a position where can_finish() is true and return the moves, or None. A face-up pile
+        # runs down to its top, so the lowest card not on the foundation is always on top of a pile
+        # or in the stockpile/waste; the pass plays every card that fits the foundation and otherwise
+        # draws. In draw-1 the whole stockpile comes round and this always wins. In draw-3 some cards
+        # can stay out of reach; the moves are then taken back and None is returned.
+        if not self.can_finish():
+            return None
+        saved_redo = self.redo_history  # Moves clear the redo history; it only goes if the attempt succeeds
+        self.redo_history = Stack()
+        moves = []
+        draws = 0  # Draws since a card last went to the foundation
+        while not self.check_win():
+            move = self.next_foundation_move()
+            if move is None:
+                if draws > self.stockpile.cards.size() + self.waste_pile.cards.size():
+                    break  # A whole round of the stockpile without a card going up: stuck
+                move = DRAW_MOVE
+                draws += 1
+            else:
+                draws = 0
+            if self.apply_move(move) != "":
+                break
+            moves.append(move)
+        if not self.check_win():
+            for _ in moves:
+                self.undo()
+            self.redo_history = saved_redo  # The attempt leaves the player's redo history as it was
+            return None
+        return moves
+
+    def next_foundation_move(self):
+        # A move of a tableau top or the waste top to the foundation, or None; the suit heights say what fits
+        heights = self.suit_heights
+        for i, pile in self.tableau.piles.items():
+            if not pile.is_empty():
+                card = pile.get_last()
+                if card.face_up and heights[card.suit_id] == card.rank_value:
+                    return ('tableau', i, 'foundation', self.foundation_slot(card), 1)
         if not self.waste_pile.is_empty():
-            waste_card = self.waste_pile.top_card()  # Get the top card from the waste pile
-            for tableau_idx, tableau_pile in self.tableau.piles.items():
-                if self.is_move_valid(waste_card, tableau_idx):  # Check if the card can be moved to a tableau pile
-                    # Valid move from waste to tableau found, set hint and return
-                    self.hint = ('waste', 0, 'tableau', tableau_idx, 1)
-                    return
-        # If no valid move is found, set hint to None
-        self.hint = None
+            card = self.waste_pile.top_card()
+            if heights[card.suit_id] == card.rank_value:
+                return ('waste', 0, 'foundation', self.foundation_slot(card), 1)
+        return None
 
     def is_move_valid(self, card, to_pile):
         # Check if the destination pile is empty, any card can be placed in an empty pile
         if self.tableau.piles[to_pile].is_empty():
             return True
         # Get the top card of the destination pile
-        top_card = self.tableau.piles[to_pile].display()[-1]
+        top_card = self.tableau.piles[to_pile].get_last()
         if top_card.face_up:
-            # Check if the card is of opposite color and one rank lower than the top card
-            print(top_card , "top cards of destination")
-            print(self.is_opposite_color(card, top_card) , self.is_one_rank_lower(card, top_card) )
-            return (self.is_opposite_color(card, top_card) and self.is_one_rank_lower(card, top_card))
+            # The card must be of opposite color and one rank lower than the top card: one table lookup
+            return CAN_STACK[card.code][top_card.code]
         # If the top card is face-down, the move is not valid
         return False
 
     def is_opposite_color(self, card1, card2): # check the card is opposite colors 
-        print("first 1 ", card1.suit in ['Hearts', 'Diamonds'] and card2.suit in ['Clubs', 'Spades'] )
-        print("first 2 ", card1.suit in ['Clubs', 'Spades'] and card2.suit in ['Hearts', 'Diamonds'])
-        return (card1.suit in ['Hearts', 'Diamonds'] and card2.suit in ['Clubs', 'Spades']) or \
-            (card1.suit in ['Clubs', 'Spades'] and card2.suit in ['Hearts', 'Diamonds'])
+        return card1.color != card2.color
 
     def is_one_rank_lower(self, card1, card2): # check card is one rank lower to other card
-        rank_order = self.deck.ranks
-        return rank_order.index(card1.rank) == rank_order.index(card2.rank) - 1
+        return card1.rank_value == card2.rank_value - 1
 
     def initialize_stockpile(self): # initialize the stockpile with remaining cards
         remaining_cards = self.deck.draw_card(len(self.deck.cards))
         for card in remaining_cards:
+            card.face_up = False  # The stockpile is face down
             self.stockpile.add_card(card)
 
     def log_tableau_state(self): # log the initial state of the tableau
@@ -272,22 +663,55 @@ class Game:
                 state = 'up' if card.face_up else 'down'
                 card_descriptions.append(f"{card.rank} of {card.suit} ({state})")
             
-            print(f"Tableau Pile {key}: {', '.join(card_descriptions)}")
+            logger.debug("Tableau Pile %s: %s", key, ', '.join(card_descriptions))
+
+    def set_position(self, tableau_piles, foundation_piles, stock_cards, waste_cards):
+        # Put the board in a given position (lists of Cards, bottom card first; the stockpile front first).
+        # Undo/redo history is dropped since it belongs to the old position.
+        for i, pile in self.tableau.piles.items():
+            pile.clear()
+            for card in tableau_piles[i]:
+                pile.insert_at_tail(card)
+        for pile, cards in zip(self.foundation.piles, foundation_piles):
+            pile.items = list(cards)
+        self.stockpile.cards.load(list(stock_cards))
+        self.waste_pile.cards.items = list(waste_cards)
+        self.card_tracking = {}
+        for i, cards in enumerate(tableau_piles):
+            for card in cards:
+                self.card_tracking[card.code] = [("Tableau", i)]
+        for i, cards in enumerate(foundation_piles):
+            for card in cards:
+                self.card_tracking[card.code] = [("Foundation", i)]
+        for card in waste_cards:
+            self.card_tracking[card.code] = [("Waste Pile", 0)]
+        self.move_history.clear()
+        self.redo_history.clear()
+        self.hint = None
+        self.dirty_piles = set(range(7))
+        self.suit_heights = [0] * 4
+        for cards in foundation_piles:
+            if cards:
+                self.suit_heights[cards[0].suit_id] = len(cards)
+        self.face_down_cards = sum(not card.face_up for cards in tableau_piles for card in cards)
+        self.zobrist.reset(self)
 
     def draw_from_stockpile(self):
-        # Check if stockpile has cards, and draw the top card to waste pile
+        # Check if stockpile has cards, and draw up to draw_count cards onto the waste pile
         if not self.stockpile.is_empty():
-            # self.save_state()
-            drawn_card = self.stockpile.remove_card()
-            drawn_card.face_up = True  # Set card face-up
-            self.waste_pile.add_card(drawn_card)
-            self.card_tracking[str(drawn_card)] = [("Waste Pile", 0)]  # Track the drawn card's position
+            count = min(self.draw_count, self.stockpile.cards.size())
+            for _ in range(count):
+                drawn_card = self.stockpile.remove_card()
+                drawn_card.face_up = True  # Set card face-up
+                self.waste_pile.add_card(drawn_card)
+                self.zobrist.toggle_stock(drawn_card)
+                self.zobrist.toggle_waste(drawn_card)
+                self.card_tracking[drawn_card.code] = [("Waste Pile", 0)]  # Track the drawn card's position
+            self.record_history({'type': 'draw', 'count': count})  # Remember how many cards were drawn for undo
         # If stockpile is empty, check if waste pile has cards to refill the stockpile
         elif not self.waste_pile.is_empty():
-            while not self.waste_pile.is_empty():
-                card = self.waste_pile.remove_card()
-                card.face_up = False  # Set cards face-down when moving back to stockpile
-                self.stockpile.add_card(card)  # Add cards back to stockpile
+            self.recycle_waste()
+            self.record_history({'type': 'recycle'})
 
     def check_win(self):
         # Check if all foundation piles have 13 cards (one of each rank)
@@ -295,118 +719,195 @@ class Game:
             if pile.size() != 13:
                 return False  # If any pile doesn't have 13 cards, the game is not won yet
                 
-        print("You Win!")  # If all piles have 13 cards, print winning message
+        if debug_log.enabled:
+            logger.debug("You Win!")  # If all piles have 13 cards, log the winning message
         return True  # Return True indicating that the player has won
 
-    def save_state(self):
-        # Create a copy of the stockpile with the face-up state of each card
-        stockpile_copy = []
-        stockpile_copy = self.stockpile.display()
-        waste_pile_copy = []
-        waste_pile_copy = self.waste_pile.display()
-        # Create a copy of the tableau piles with the face-up state of each card
-        tableau_cards = {}
-        for key, pile in self.tableau.piles.items():
-            pile_cards = []
-            while not pile.is_empty():
-                card = pile.remove_tail()  # Remove cards from the tableau pile
-                pile_cards.append((card, card.face_up))  # Store each card's face-up state
-            # Restore the tableau piles in reverse order
-            for card, _ in reversed(pile_cards):
-                pile.insert_at_tail(card)
-            tableau_cards[key] = pile_cards  # Store the tableau state
-        # Create a copy of the foundation piles with the face-up state of each card
-        foundation_cards = []
-        for pile in self.foundation.piles:
-            pile_cards = []
-            while not pile.is_empty():
-                card = pile.pop()  # Remove cards from the foundation pile
-                pile_cards.append((card, card.face_up))  # Store each card's face-up state
-            # Restore the foundation piles in reverse order
-            for card, _ in reversed(pile_cards):
-                pile.push(card)
-            foundation_cards.append(pile_cards)  # Store the foundation state
-
-        # Create a state dictionary containing all the copies
-        state = {
-            'stockpile': stockpile_copy,
-            'waste_pile': waste_pile_copy,
-            'tableau': tableau_cards,
-            'foundation': foundation_cards
-        }
-        # Push the state onto the move history stack for undo functionality
-        self.move_history.push(state)
+    def reveal_bottom_face_down(self, pile_index):
+        # Flip the source pile's new last card if it is face down; returns True when a card was revealed
+        if self.tableau.reveal_bottom_face_down([pile_index]):
+            pile = self.tableau.piles[pile_index]
+            self.zobrist.flip_tableau(pile_index, pile.get_last(), pile.size() - 1)
+            self.dirty_piles.add(pile_index)
+            self.face_down_cards -= 1
+            return True
+        return False
+
+    def flip_top_card(self, pile_index):
+        # Flip the last card of a tableau pile (used when undoing/redoing a reveal)
+        pile = self.tableau.piles[pile_index]
+        pile.get_last().flip()
+        self.zobrist.flip_tableau(pile_index, pile.get_last(), pile.size() - 1)
+        self.dirty_piles.add(pile_index)
+        self.face_down_cards += -1 if pile.get_last().face_up else 1
+
+    def state_hash(self):
+        # 64-bit hash of the exact board (tableau with face-up flags, foundation, stockpile and waste)
+        return self.zobrist.exact()
+
+    def canonical_hash(self):
+        # 64-bit hash that ignores tableau column order and foundation slot order
+        return self.zobrist.canonical()
+
+    def recycle_waste(self):
+        # Turn the waste pile back over into the stockpile by swapping buffers instead of moving cards
+        # one by one. The stockpile is drawn in the same order as before, as in regular Klondike.
+        cards = self.waste_pile.cards.items
+        for card in cards:
+            card.face_up = False  # The stockpile is face down
+        self.stockpile.cards.load(cards)
+        self.waste_pile.cards.clear()
+        self.zobrist.recycle()
+
+    def unrecycle_waste(self):
+        # Inverse of recycle_waste: hand the stockpile buffer back to the waste pile
+        cards = self.stockpile.cards.take_all()
+        for card in cards:
+            card.face_up = True
+        self.waste_pile.cards.items = cards
+        self.zobrist.unrecycle()
+
+    def transfer_cards(self, from_pile_name, from_index, to_index, to_pile_name, num_cards):
+        # Move the top num_cards cards between two piles without any rule checks (used by moves, undo and redo)
+        if from_pile_name == "tableau" and to_pile_name == "tableau":
+            source_pile, target_pile = self.tableau.piles[from_index], self.tableau.piles[to_index]
+            run = source_pile.splice_tail(num_cards)
+            cards = run.display()
+            self.dirty_piles.update((from_index, to_index))
+            self.zobrist.toggle_tableau(from_index, cards, source_pile.size())
+            self.zobrist.toggle_tableau(to_index, cards, target_pile.size())
+            target_pile.extend(run)
+            return
+        cards = [self.remove_top_card(from_pile_name, from_index) for _ in range(num_cards)]
+        for card in reversed(cards):
+            self.add_top_card(to_pile_name, to_index, card)
+
+    def remove_top_card(self, pile_name, index):
+        # Remove and return the top card of the named pile
+        if pile_name == "tableau":
+            card = self.tableau.piles[index].remove_tail()
+            self.dirty_piles.add(index)
+            self.zobrist.toggle_tableau(index, (card,), self.tableau.piles[index].size())
+        elif pile_name == "foundation":
+            card = self.foundation.piles[index].pop()
+            self.zobrist.toggle_foundation(index, card)
+            self.suit_heights[card.suit_id] -= 1
+        else:
+            card = self.waste_pile.remove_card()
+            self.zobrist.toggle_waste(card)
+        return card
+
+    def add_top_card(self, pile_name, index, card):
+        # Put a card on top of the named pile
+        if pile_name == "tableau":
+            self.zobrist.toggle_tableau(index, (card,), self.tableau.piles[index].size())
+            self.tableau.piles[index].insert_at_tail(card)
+            self.dirty_piles.add(index)
+        elif pile_name == "foundation":
+            self.foundation.piles[index].push(card)
+            self.zobrist.toggle_foundation(index, card)
+            self.suit_heights[card.suit_id] += 1
+        else:
+            self.waste_pile.add_card(card)
+            self.zobrist.toggle_waste(card)
+
+    def record_move(self, from_pile_name, from_index, to_index, to_pile_name, num_cards, flipped=False):
+        # Store only what the move changed: which cards went where, and whether a tableau card was revealed
+        self.record_history({'type': 'move', 'from': (from_pile_name, from_index), 'to': (to_pile_name, to_index),
+                             'num_cards': num_cards, 'flipped': flipped})
+
+    def record_history(self, delta):
+        # Push a delta for undo; a new action makes the redo history invalid
+        self.move_history.push(delta)
+        self.redo_history.clear()
 
     def undo(self):
         # Check if there are any moves in the history to undo
-        if self.move_history.size() > 0:
-            # Pop the last state from the move history stack
-            last_state = self.move_history.pop()
+        if self.move_history.is_empty():
+            return False  # Return False if there are no moves to undo
+        delta = self.move_history.pop()
+        if delta['type'] == 'move':
+            from_pile_name, from_index = delta['from']
+            to_pile_name, to_index = delta['to']
+            if delta['flipped']:
+                self.flip_top_card(from_index)  # Turn the revealed card back face down
+            self.transfer_cards(to_pile_name, to_index, from_index, from_pile_name, delta['num_cards'])
+        elif delta['type'] == 'draw':
+            for _ in range(delta['count']):
+                card = self.waste_pile.remove_card()
+                card.face_up = False
+                self.stockpile.cards.push_front(card)  # Cards go back to the front of the stockpile
+                self.zobrist.toggle_waste(card)
+                self.zobrist.toggle_stock(card)
+        else:
+            self.unrecycle_waste()
+        self.redo_history.push(delta)
+        return True  # Return True to indicate that the undo was successful
 
-            # Clear the waste pile and restore it from the last state
-            self.waste_pile.cards.clear()
-            for card in last_state['waste_pile']:
+    def redo(self):
+        # Re-apply the most recently undone delta
+        if self.redo_history.is_empty():
+            return False
+        delta = self.redo_history.pop()
+        if delta['type'] == 'move':
+            from_pile_name, from_index = delta['from']
+            to_pile_name, to_index = delta['to']
+            self.transfer_cards(from_pile_name, from_index, to_index, to_pile_name, delta['num_cards'])
+            if delta['flipped']:
+                self.flip_top_card(from_index)
+        elif delta['type'] == 'draw':
+            for _ in range(delta['count']):
+                card = self.stockpile.remove_card()
+                card.face_up = True
                 self.waste_pile.add_card(card)
-
-            # Clear the stockpile and restore it from the last state
-            self.stockpile.cards.clear()
-            for card in last_state['stockpile']:
-                self.stockpile.add_card(card)
-
-            # Restore each tableau pile from the last state
-            for pile_key, saved_pile_cards in last_state['tableau'].items():
-                self.tableau.piles[pile_key].clear()
-                for card, face_up in reversed(saved_pile_cards):
-                    card.face_up = face_up  # Restore the face-up state
-                    self.tableau.piles[pile_key].insert_at_tail(card)
-
-            # Restore each foundation pile from the last state
-            for i, saved_pile_cards in enumerate(last_state['foundation']):
-                self.foundation.piles[i].clear()
-                for card, face_up in reversed(saved_pile_cards):
-                    card.face_up = face_up  # Restore the face-up state
-                    self.foundation.piles[i].push(card)
-
-            # Return True to indicate that the undo was successful
-            return True
-
-        # Return False if there are no moves to undo
-        return False
+                self.zobrist.toggle_stock(card)
+                self.zobrist.toggle_waste(card)
+        else:
+            self.recycle_waste()
+        self.move_history.push(delta)  # Pushed directly so the rest of the redo history is kept
+        return True
 
     def __str__(self):
         # Return a string representation of the current state of the game
         return f"Tableau:\n{self.tableau}\n\nFoundation:\n{self.foundation}\n\nStockpile:\n{self.stockpile}"
 
 class Node:
+    __slots__ = ('data', 'next', 'prev')
+
     def __init__(self, data):
-        # Initialize a new node with given data and set next to None
+        # Initialize a new node with given data and no neighbours
         self.data = data
         self.next = None
+        self.prev = None
 
 class LinkedList:
     
     def __init__(self):
-        # Initialize the linked list with the head set to None
+        # Initialize the doubly linked list with head/tail set to None and a cached length
         self.head = None
+        self.tail = None
+        self.length = 0
 
     def is_empty(self):
         # Check if the linked list is empty (i.e., head is None)
         return self.head is None
 
     def get_last(self):
-        # Get the last element in the linked list
+        # Get the last element in the linked list (O(1) through the tail pointer)
         if self.is_empty():
             raise IndexError("Cannot get last element from an empty linked list.")
-        current = self.head
-        while current.next:  # Traverse to the last node
-            current = current.next
-        return current.data
+        return self.tail.data
     
     def insert_at_head(self, data):
         # Insert a new node with data at the beginning (head) of the linked list
         new_node = Node(data)
         new_node.next = self.head  # Point new node to the current head
+        if self.head is None:
+            self.tail = new_node  # The only node is both head and tail
+        else:
+            self.head.prev = new_node
         self.head = new_node  # Update head to new node
+        self.length += 1
         
     def insert_at_tail(self, data):
         # Insert a new node with data at the end (tail) of the linked list
@@ -414,27 +915,26 @@ class LinkedList:
         if self.is_empty():
             self.head = new_node  # If the list is empty, make new node the head
         else:
-            current = self.head
-            while current.next:  # Traverse to the last node
-                current = current.next
-            current.next = new_node  # Add new node at the end
-            
+            new_node.prev = self.tail
+            self.tail.next = new_node  # Add new node at the end
+        self.tail = new_node
+        self.length += 1
+
     def get_node_at_index(self, index):
-        # Get the data of the node at a specific index in the linked list
+        # Get the data of the node at a specific index, walking from whichever end is closer
         if index < 0:
             raise IndexError("Index cannot be negative")
-        
-        current = self.head
-        current_index = 0
-
-        while current:
-            if current_index == index:
-                return current.data  # Return data when the index is found
-            current = current.next
-            current_index += 1
-
-        # If we reach here, the index was out of bounds
-        raise IndexError("Index out of bounds")
+        if index >= self.length:
+            raise IndexError("Index out of bounds")
+        if index < self.length // 2:
+            current = self.head
+            for _ in range(index):
+                current = current.next
+        else:
+            current = self.tail
+            for _ in range(self.length - 1 - index):
+                current = current.prev
+        return current.data
     
     
     def insert_at_index(self, index, data):
@@ -442,38 +942,74 @@ class LinkedList:
         if index < 0:
             raise IndexError("Index cannot be negative")
         
-        new_node = Node(data)
-        
         if index == 0:
             self.insert_at_head(data)  # If index is 0, insert at head
             return
+        if index > self.length:
+            raise IndexError("Index out of bounds")
+        if index == self.length:
+            self.insert_at_tail(data)  # Inserting after the last node is a tail insert
+            return
         
         current = self.head
         for _ in range(index - 1):  # Traverse to the node before the given index
-            if current is None:
-                raise IndexError("Index out of bounds")
             current = current.next
         
         # Insert the new node at the given index
+        new_node = Node(data)
+        new_node.prev = current
         new_node.next = current.next
+        current.next.prev = new_node
         current.next = new_node
+        self.length += 1
         
     def remove_tail(self):
         # Remove and return the last node from the linked list
         if self.is_empty():
             raise IndexError("Pop from empty linked list")
         
-        current = self.head
-        if current.next is None:  # If only one element exists
-            value = current.data
+        node = self.tail
+        self.tail = node.prev
+        if self.tail is None:  # If only one element existed
             self.head = None  # Set head to None
-            return value
-        while current.next and current.next.next:  # Traverse to the second last node
-            current = current.next
-        
-        value = current.next.data  # Get the last node's data
-        current.next = None  # Remove the last node
-        return value
+        else:
+            self.tail.next = None  # Remove the last node
+        node.prev = None
+        self.length -= 1
+        return node.data
+
+    def splice_tail(self, count):
+        # Detach the last `count` nodes in O(count) and return them as a new LinkedList (order kept)
+        if count <= 0:
+            return LinkedList()
+        if count > self.length:
+            raise IndexError("Cannot splice more nodes than the list holds")
+        first = self.tail
+        for _ in range(count - 1):  # Walk back from the tail to the first node to detach
+            first = first.prev
+        chain = LinkedList()
+        chain.head, chain.tail, chain.length = first, self.tail, count
+        self.tail = first.prev
+        if self.tail is None:
+            self.head = None
+        else:
+            self.tail.next = None
+        first.prev = None
+        self.length -= count
+        return chain
+
+    def extend(self, other):
+        # Link every node of another LinkedList onto our tail in O(1); the other list is left empty
+        if other.is_empty():
+            return
+        if self.is_empty():
+            self.head = other.head
+        else:
+            self.tail.next = other.head
+            other.head.prev = self.tail
+        self.tail = other.tail
+        self.length += other.length
+        other.clear()
     
     def peek(self):
         # Return the data of the first element in the linked list
@@ -484,6 +1020,8 @@ class LinkedList:
     def clear(self):
         # Clear all elements from the linked list
         self.head = None
+        self.tail = None
+        self.length = 0
 
     def display(self):
         # Return a list of all elements in the linked list
@@ -497,30 +1035,26 @@ class LinkedList:
     def delete(self, key):
         # Delete the first occurrence of the key from the linked list
         current = self.head
-        if current and current.data == key:
-            self.head = current.next  # If the key is at head, update head
-            current = None
-            return
-
-        prev = None
         while current and current.data != key:  # Traverse to find the node with the key
-            prev = current
             current = current.next
 
         if current is None:  # If key is not found
             return
 
-        prev.next = current.next  # Remove the node by linking the previous node to the next node
-        current = None
+        # Unlink the node from both of its neighbours
+        if current.prev is None:
+            self.head = current.next  # If the key is at head, update head
+        else:
+            current.prev.next = current.next
+        if current.next is None:
+            self.tail = current.prev  # If the key is at tail, update tail
+        else:
+            current.next.prev = current.prev
+        self.length -= 1
 
     def size(self):
-        # Return the number of elements in the linked list
-        current = self.head
-        count = 0
-        while current:  # Traverse the list and count nodes
-            count += 1
-            current = current.next
-        return count
+        # Return the number of elements in the linked list (cached, O(1))
+        return self.length
 
 class Stack:
     def __init__(self):
@@ -551,7 +1085,8 @@ class Stack:
         if not self.is_empty():
             return self.items[-1]
         else:
-            print("peek from empty stack")
+            if debug_log.enabled:
+                logger.debug("peek from empty stack")
             return -1
 
     def size(self):
@@ -569,43 +1104,69 @@ class Stack:
 
 class Queue:
     def __init__(self):
-        # Initializes an empty queue
+        # Initializes an empty queue; items before index `front` have already been dequeued,
+        # so dequeue just moves the index forward instead of shifting the whole list
         self.items = []
+        self.front = 0
 
     def is_empty(self):
         # Returns True if the queue is empty, otherwise False
-        return len(self.items) == 0
+        return self.front == len(self.items)
 
     def enqueue(self, item):
         # Adds an item to the end of the queue
+        if self.front and self.is_empty():
+            self.clear()  # Drop the already-dequeued slots before reusing the buffer
         self.items.append(item)
 
+    def push_front(self, item):
+        # Puts an item back at the front of the queue (used to undo a dequeue)
+        if self.front > 0:
+            self.front -= 1
+            self.items[self.front] = item  # Reuse the slot the item was dequeued from
+        else:
+            self.items.insert(0, item)
+
     def dequeue(self):
-        # Removes and returns the front item from the queue
+        # Removes and returns the front item from the queue in O(1)
         if not self.is_empty():
-            return self.items.pop(0)
+            item = self.items[self.front]
+            self.front += 1
+            return item
         else:
             raise IndexError("dequeue from empty queue")
 
+    def load(self, items):
+        # Takes over a list as the queue buffer in O(1); items[0] becomes the front
+        self.items = items
+        self.front = 0
+
+    def take_all(self):
+        # Empties the queue and returns its remaining items as a list (O(1) when nothing was dequeued)
+        items = self.items if self.front == 0 else self.items[self.front:]
+        self.clear()
+        return items
+
     def clear(self):
         """Clears all items from the queue."""
         self.items = []
+        self.front = 0
 
     def peek(self):
         # Returns the front item of the queue without removing it
         if not self.is_empty():
-            return self.items[0]
+            return self.items[self.front]
         else:
             raise IndexError("peek from empty queue")
 
     def size(self):
         # Returns the number of items in the queue
-        return len(self.items)
+        return len(self.items) - self.front
 
     def display(self):
         # Returns a copy of the items in the queue
-        return self.items[:]
+        return self.items[self.front:]
 
     def __str__(self):
         # String representation of the queue
-        return str(self.items)
+        return str(self.items[self.front:])
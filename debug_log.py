@@ -0,0 +1,43 @@
+import logging
+import logging.handlers
+import os
+import sys
+
+# Leveled logging for the game. Hot paths test the module flag `enabled` before building a
+# message, so with debug traces off a log call costs one attribute lookup:
+#
+#     if debug_log.enabled:
+#         logger.debug("Moved %d card(s)", num_cards)
+#
+# Debug traces are opt-in (enable() or SOLITAIRE_DEBUG=1) and go through a MemoryHandler, so
+# records are written to the sink in batches instead of one synchronous write per line.
+
+logger = logging.getLogger("solitaire")
+enabled = False  # True while debug traces are switched on
+
+BUFFER_CAPACITY = 1000  # Records held in memory before they are written out
+
+def enable(path=None, level=logging.DEBUG, capacity=BUFFER_CAPACITY):
+    # Switch traces on; they go to `path` (or stderr) through an in-memory buffer
+    global enabled
+    disable()
+    target = logging.FileHandler(path) if path else logging.StreamHandler(sys.stderr)
+    target.setFormatter(logging.Formatter("%(relativeCreated)d %(levelname)s %(message)s"))
+    # Buffered records are flushed when the buffer fills, on an ERROR, or at interpreter exit
+    logger.addHandler(logging.handlers.MemoryHandler(capacity, flushLevel=logging.ERROR, target=target))
+    logger.setLevel(level)
+    logger.propagate = False
+    enabled = level <= logging.DEBUG
+
+def disable():
+    # Switch traces off and flush whatever is still buffered
+    global enabled
+    enabled = False
+    for handler in list(logger.handlers):
+        handler.close()  # MemoryHandler flushes to its target on close
+        logger.removeHandler(handler)
+    logger.setLevel(logging.NOTSET)
+    logger.propagate = True
+
+if os.environ.get("SOLITAIRE_DEBUG"):
+    enable(os.environ.get("SOLITAIRE_LOG"))
@@ -0,0 +1,179 @@
+import random
+import numpy as np
+from actions import ACTION_COUNT, MAX_RUN, action_to_move, move_to_action
+from batch_engine import EMPTY, BatchGame
+from classes import Game
+
+# Gym-style environments for training move policies. reset()/step() follow the Gymnasium
+# conventions (step returns observation, reward, terminated, truncated, info) without depending
+# on it. Actions are the indices of actions.py; the legal ones are given as a boolean mask, also
+# passed as info['action_mask'].
+#
+# An observation is one int8 vector, card codes or EMPTY (-1) unless noted:
+#   OBS_TABLEAU     7 x 13  face-up cards of each tableau pile, lowest first
+#   OBS_FACE_DOWN   7       face-down cards under each pile (a count)
+#   OBS_FOUNDATION  4       top card of each foundation slot
+#   OBS_WASTE       1       top card of the waste pile
+#   OBS_STOCK_SIZE  1       cards in the stockpile (a count)
+#   OBS_WASTE_SIZE  1       cards in the waste pile (a count)
+# Observations and masks are preallocated and updated in place, so the arrays returned by
+# reset()/step() are the same objects every call; copy them to keep one.
+#
+# The reward of a step is the change in the number of foundation cards. A game is terminated
+# when it is won and truncated after max_steps moves.
+
+OBS_TABLEAU = 0
+OBS_FACE_DOWN = OBS_TABLEAU + 7 * MAX_RUN
+OBS_FOUNDATION = OBS_FACE_DOWN + 7
+OBS_WASTE = OBS_FOUNDATION + 4
+OBS_STOCK_SIZE = OBS_WASTE + 1
+OBS_WASTE_SIZE = OBS_STOCK_SIZE + 1
+OBSERVATION_SIZE = OBS_WASTE_SIZE + 1
+MAX_STEPS = 1000  # Moves after which an episode is truncated
+
+class SolitaireEnv:
+    # One Game behind the environment API. `observation` and `mask` may be views into bigger
+    # arrays (a row of a batch) for the environment to write into.
+    def __init__(self, draw_count=1, max_steps=MAX_STEPS, observation=None, mask=None):
+        self.draw_count = draw_count
+        self.max_steps = max_steps
+        self.observation = np.full(OBSERVATION_SIZE, EMPTY, np.int8) if observation is None else observation
+        self.mask = np.zeros(ACTION_COUNT, bool) if mask is None else mask
+        self.tableau_rows = self.observation[OBS_TABLEAU:OBS_FACE_DOWN].reshape(7, MAX_RUN)  # Views, one per pile
+        self.game = None
+        self.steps = 0
+        self.foundation_cards = 0
+
+    def reset(self, seed=None):
+        # Deal a new game (a random deal number when seed is None)
+        self.game = Game(seed, self.draw_count)
+        self.steps = 0
+        self.foundation_cards = 0
+        self.update_mask()
+        for i in range(7):
+            self.write_pile(i)
+        self.write_foundation_and_talon()
+        return self.observation, {'seed': self.game.seed, 'action_mask': self.mask}
+
+    def step(self, action):
+        # Play an action index. An illegal action changes nothing and is reported in info['legal'].
+        action = int(action)
+        legal = 0 <= action < ACTION_COUNT and bool(self.mask[action])
+        if legal:
+            move = action_to_move(self.game, action)
+            self.game.apply_move(move)
+            self.steps += 1
+            self.update_mask()  # Also refreshes the game's face-up run cache that write_pile reads
+            from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+            if from_pile_name == "tableau":
+                self.write_pile(from_index)
+            if to_pile_name == "tableau":
+                self.write_pile(to_index)
+            self.write_foundation_and_talon()
+        cards = self.foundation_count()
+        reward = cards - self.foundation_cards
+        self.foundation_cards = cards
+        terminated = cards == 52
+        truncated = not terminated and self.steps >= self.max_steps
+        return self.observation, reward, terminated, truncated, {'legal': legal, 'action_mask': self.mask}
+
+    def legal_mask(self):
+        return self.mask
+
+    def update_mask(self):
+        self.mask[:] = False
+        for move in self.game.legal_moves():
+            self.mask[move_to_action(move)] = True
+
+    def write_pile(self, i):
+        # Face-up cards and face-down count of tableau pile i. legal_moves() keeps each pile's
+        # face-up run cached (top card first), so the pile itself is not walked again.
+        runs = self.game.pile_move_cache[i]
+        row = self.tableau_rows[i]
+        row[:] = EMPTY
+        for num_cards, card in runs:
+            row[len(runs) - num_cards] = card.code
+        self.observation[OBS_FACE_DOWN + i] = self.game.tableau.piles[i].size() - len(runs)
+
+    def write_foundation_and_talon(self):
+        observation = self.observation
+        for slot, pile in enumerate(self.game.foundation.piles):
+            observation[OBS_FOUNDATION + slot] = pile.items[-1].code if pile.items else EMPTY
+        waste = self.game.waste_pile.cards.items
+        observation[OBS_WASTE] = waste[-1].code if waste else EMPTY
+        observation[OBS_STOCK_SIZE] = self.game.stockpile.cards.size()
+        observation[OBS_WASTE_SIZE] = len(waste)
+
+    def foundation_count(self):
+        return sum(pile.size() for pile in self.game.foundation.piles)
+
+class SolitaireVectorEnv:
+    # Many games stepped together on the batch engine, with the same observations, actions and
+    # rewards as SolitaireEnv. Observations ([count, OBSERVATION_SIZE]) and legal masks
+    # ([count, ACTION_COUNT]) are written in place. A game that ends is dealt a new random deal
+    # straight away, so the observation returned for it is already the new game's; its reward,
+    # terminated and truncated entries belong to the game that ended.
+    def __init__(self, count, draw_count=1, max_steps=MAX_STEPS):
+        self.count = count
+        self.max_steps = max_steps
+        self.batch = BatchGame(count, draw_count)
+        self.observations = np.full((count, OBSERVATION_SIZE), EMPTY, np.int8)
+        self.masks = np.zeros((count, ACTION_COUNT), bool)
+        self.rewards = np.zeros(count, np.int8)
+        self.terminated = np.zeros(count, bool)
+        self.truncated = np.zeros(count, bool)
+        self.seeds = [None] * count  # Deal number of the game in each slot
+        self.rng = random.Random()
+
+    def reset(self, seeds=None):
+        # Deal every game: from `seeds` (one per game), or random deal numbers.
+        # An int seeds the generator that picks the deal numbers, here and for later auto-resets.
+        if seeds is None or isinstance(seeds, int):
+            self.rng = random.Random(seeds)
+            seeds = [self.rng.randrange(2 ** 32) for _ in range(self.count)]
+        self.seeds = list(seeds)
+        self.batch.deal(self.seeds)
+        self.update()
+        return self.observations, {'seeds': self.seeds, 'action_mask': self.masks}
+
+    def step(self, actions):
+        # Play one action index per game; returns (observations, rewards, terminated, truncated, info)
+        batch = self.batch
+        before = batch.foundation_sizes.sum(axis=1)
+        legal = batch.step(actions, self.masks)
+        after = batch.foundation_sizes.sum(axis=1)
+        np.subtract(after, before, out=self.rewards, casting="unsafe")
+        np.equal(after, 52, out=self.terminated)
+        np.greater_equal(batch.steps, self.max_steps, out=self.truncated)
+        self.truncated &= ~self.terminated
+        ended = np.flatnonzero(self.terminated | self.truncated)
+        if len(ended):
+            seeds = [self.rng.randrange(2 ** 32) for _ in ended]
+            for game, seed in zip(ended, seeds):
+                self.seeds[game] = seed
+            batch.deal(seeds, games=ended)
+        self.update()
+        return self.observations, self.rewards, self.terminated, self.truncated, {'legal': legal,
+                                                                                  'action_mask': self.masks}
+
+    def update(self):
+        batch = self.batch
+        batch.legal_mask(out=self.masks)
+        write_observations(batch, self.observations)
+
+    def legal_masks(self):
+        return self.masks
+
+def write_observations(batch, out):
+    # Observations of every game of a BatchGame, written into `out` ([count, OBSERVATION_SIZE])
+    face_down = batch.face_down.astype(np.intp)
+    depths = np.arange(MAX_RUN)
+    positions = batch.pile_starts[:, :, None] + face_down[:, :, None] + depths  # Never past a pile's last slot
+    face_up = np.where(depths < (batch.tableau_sizes - batch.face_down)[:, :, None],
+                       batch.tableau.reshape(-1)[positions], EMPTY)
+    out[:, OBS_TABLEAU:OBS_FACE_DOWN] = face_up.reshape(batch.count, 7 * MAX_RUN)
+    out[:, OBS_FACE_DOWN:OBS_FOUNDATION] = batch.face_down
+    out[:, OBS_FOUNDATION:OBS_WASTE] = batch.foundation_tops()
+    out[:, OBS_WASTE] = batch.waste_tops()
+    out[:, OBS_STOCK_SIZE] = batch.talon_sizes - batch.waste_sizes
+    out[:, OBS_WASTE_SIZE] = batch.waste_sizes
@@ -0,0 +1,131 @@
+import multiprocessing
+import time
+import solver
+from savegame import SNAPSHOT_FORMATS, SNAPSHOT_VERSION, pack_snapshot, unpack_snapshot
+
+# Hint search off the UI thread. The game loop sends a snapshot of the board (the save-game
+# snapshot, ~130 bytes) to a worker process, which runs the solver's depth-first search from it
+# under a time budget. The worker reports the best first move it knows as soon as it has one (the
+# one-ply hint straight away), again whenever the search finds a better position, and once more
+# when it is done. Every request carries a number; a new request or a cancel makes the worker drop
+# the search it is on, and replies to older requests are ignored. The game loop only polls a pipe,
+# so a search of any length costs the frame loop nothing.
+
+HINT_TIME_BUDGET = 0.5  # Seconds the worker searches for one hint
+MAX_NODES = 1000000  # Node budget per hint; in practice the time budget ends the search first
+CHECK_INTERVAL = 64  # Positions searched between checks for a newer request
+FOUNDATION_WEIGHT = 10  # Evaluation of a position, see evaluate()
+REVEAL_WEIGHT = 5
+EMPTY_PILE_WEIGHT = 2
+
+def evaluate(game):
+    # How far along a position is: cards on the foundation, face-down cards left, empty tableau piles.
+    # Reads the face-up run cache, which legal_moves() has just brought up to date in the search.
+    score = FOUNDATION_WEIGHT * sum(pile.size() for pile in game.foundation.piles)
+    for i, pile in game.tableau.piles.items():
+        size = pile.size()
+        score -= REVEAL_WEIGHT * (size - len(game.pile_move_cache[i]))
+        if size == 0:
+            score += EMPTY_PILE_WEIGHT
+    return score
+
+def search_hint(game, time_limit, report, cancelled):
+    # Look for the best first move from `game`'s position. report(move, status) is called with the
+    # best move so far ('searching') and finally with 'solved' (the move starts a winning line),
+    # 'unwinnable' (no win exists; the move reaches the best position found) or 'done' (time is up).
+    # Nothing final is reported if cancelled() turns true first.
+    best_move = game.find_hint()
+    report(best_move, 'searching')
+    solver.ordered_moves(game)  # Brings the run cache up to date for evaluate()
+    best_score = evaluate(game)
+    nodes = 0
+
+    def visit(game, path):
+        nonlocal best_move, best_score, nodes
+        score = evaluate(game)
+        if score > best_score:
+            best_score = score
+            if path[0] != best_move:
+                best_move = path[0]
+                report(best_move, 'searching')
+        nodes += 1
+        return nodes % CHECK_INTERVAL == 0 and cancelled()
+
+    result = solver.solve(game, MAX_NODES, time_limit, visit)
+    if result.status == 'solved':
+        report(result.moves[0] if result.moves else None, 'solved')
+    elif result.status != 'stopped':
+        report(best_move, 'unwinnable' if result.status == 'unwinnable' else 'done')
+
+def hint_worker(connection):
+    # Worker process: serve (request number, snapshot, time budget) requests until None arrives.
+    # A request without a snapshot only cancels the one before it.
+    while True:
+        request = connection.recv()
+        if request is None:
+            return
+        request_id, snapshot, time_limit = request
+        if snapshot is not None:
+            game = unpack_snapshot(snapshot)[0]
+            report = lambda move, status: connection.send((request_id, move, status))
+            search_hint(game, time_limit, report, connection.poll)  # Stops early once a newer request is waiting
+
+def snapshot_of(game):
+    snapshot = bytearray(SNAPSHOT_FORMATS[SNAPSHOT_VERSION].size)
+    pack_snapshot(snapshot, 0, game)
+    return bytes(snapshot)
+
+class HintService:
+    # Front end of the hint worker for the game loop. Start it before pygame so the worker does
+    # not inherit the display and loader threads.
+    def __init__(self, time_limit=HINT_TIME_BUDGET):
+        self.time_limit = time_limit
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=hint_worker, args=(worker_connection,), name="hint-search",
+                                               daemon=True)
+        self.process.start()
+        worker_connection.close()
+        self.request_id = 0
+        self.move = None  # Best move for the current request so far
+        self.status = None  # None (no request), 'searching', or the final status from search_hint
+        self.requested_at = 0.0
+
+    def request(self, game):
+        # Start searching for a hint in `game`'s current position
+        self.request_id += 1
+        self.connection.send((self.request_id, snapshot_of(game), self.time_limit))
+        self.move = None
+        self.status = 'searching'
+        self.requested_at = time.perf_counter()
+
+    def cancel(self):
+        # Forget the hint (the board changed); a running search is stopped
+        if self.status == 'searching':
+            self.request_id += 1
+            self.connection.send((self.request_id, None, 0))
+        self.move = None
+        self.status = None
+
+    def poll(self):
+        # Take in whatever the worker has sent; returns the best move so far for the current request
+        while self.connection.poll():
+            request_id, move, status = self.connection.recv()
+            if request_id == self.request_id:
+                self.move = move
+                self.status = status
+        if self.status == 'searching' and time.perf_counter() - self.requested_at > self.time_limit * 2 + 1:
+            self.status = 'done'  # The worker is late (busy or gone): settle for what arrived
+        return self.move
+
+    def searching(self):
+        return self.status == 'searching'
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
@@ -0,0 +1,127 @@
+from bisect import bisect_right
+from classes import CARD_SIZE
+
+# Where everything sits on the board. Rendering, hints and mouse handling all take card
+# positions from one Layout, which only recomputes a pile when its contents change and answers
+# "what is under the pointer" with two binary searches over rows and columns and one over the cards of a pile.
+
+CARD_WIDTH, CARD_HEIGHT = CARD_SIZE
+PILE_SPACING = 125  # Horizontal distance between neighbouring piles
+CARD_OFFSET = 25  # Vertical offset between cards fanned out in a tableau pile
+TOP_ROW_Y = 50  # Stockpile, waste pile and foundations
+STOCK_X = 50
+WASTE_X = 150
+FOUNDATION_X = 450  # First foundation pile
+TABLEAU_X = 100  # First tableau pile
+TABLEAU_Y = 250
+
+def pile_origin(name, index):
+    # Top-left corner of a pile's first card
+    if name == 'tableau':
+        return TABLEAU_X + index * PILE_SPACING, TABLEAU_Y
+    if name == 'foundation':
+        return FOUNDATION_X + index * PILE_SPACING, TOP_ROW_Y
+    if name == 'waste':
+        return WASTE_X, TOP_ROW_Y
+    return STOCK_X, TOP_ROW_Y  # 'stock'
+
+class PileLayout:
+    # Geometry of one pile: its cards as drawn (bottom to top) and the y of each card's top edge
+    __slots__ = ('name', 'index', 'x', 'y', 'cards', 'tops', 'signature')
+
+    def __init__(self, name, index):
+        self.name = name
+        self.index = index
+        self.x, self.y = pile_origin(name, index)
+        self.cards = []
+        self.tops = []
+        self.signature = None  # Pile contents the geometry was computed for
+
+    def card_rect(self, card_index):
+        return (self.x, self.tops[card_index], CARD_WIDTH, CARD_HEIGHT)
+
+    def bottom(self):
+        # Lowest y covered by the pile (an empty pile still covers its slot)
+        return (self.tops[-1] if self.tops else self.y) + CARD_HEIGHT
+
+    def card_at(self, y):
+        # Index of the card drawn on top at height y, or None if y is on no card
+        card_index = bisect_right(self.tops, y) - 1
+        if card_index < 0 or y > self.tops[card_index] + CARD_HEIGHT:
+            return None
+        return card_index
+
+class Layout:
+    def __init__(self, game):
+        self.game = game
+        keys = [('stock', 0), ('waste', 0)] + [('foundation', i) for i in range(len(game.foundation.piles))] + \
+               [('tableau', i) for i in game.tableau.piles]
+        self.piles = {key: PileLayout(*key) for key in keys}  # (pile name, index) -> PileLayout
+        # Hit-test index: row top edges, and for each row the piles sorted by their left edge
+        rows = {}
+        for pile in self.piles.values():
+            rows.setdefault(pile.y, []).append(pile)
+        self.row_tops = sorted(rows)
+        self.row_piles = [sorted(rows[y], key=lambda pile: pile.x) for y in self.row_tops]
+        self.row_lefts = [[pile.x for pile in row] for row in self.row_piles]
+        self.update()
+
+    def signature(self, name, index):
+        # Cheap value that changes whenever what is drawn for a pile changes
+        game = self.game
+        if name == 'tableau':
+            pile = game.tableau.piles[index]
+            return (pile.size(), game.zobrist.pile_hash[index])  # The pile hash covers every card and its face
+        if name == 'foundation':
+            pile = game.foundation.piles[index]
+            return (pile.size(), pile.peek())
+        if name == 'waste':
+            return (game.waste_pile.cards.size(), None if game.waste_pile.is_empty() else game.waste_pile.top_card())
+        return game.stockpile.is_empty()
+
+    def update(self):
+        # Recompute the piles whose contents changed since the last call; returns their keys
+        changed = []
+        for key, pile in self.piles.items():
+            signature = self.signature(*key)
+            if signature != pile.signature:
+                pile.signature = signature
+                self.place_cards(pile)
+                changed.append(key)
+        return changed
+
+    def place_cards(self, pile):
+        game = self.game
+        if pile.name == 'tableau':
+            pile.cards = game.tableau.piles[pile.index].display()
+            pile.tops = [pile.y + j * CARD_OFFSET for j in range(len(pile.cards))]
+            return
+        if pile.name == 'foundation':
+            foundation_pile = game.foundation.piles[pile.index]
+            top = None if foundation_pile.is_empty() else foundation_pile.peek()
+        elif pile.name == 'waste':
+            top = None if game.waste_pile.is_empty() else game.waste_pile.top_card()
+        else:
+            top = None  # The stockpile is drawn as a card back and never hands out a card
+        pile.cards = [] if top is None else [top]
+        pile.tops = [pile.y] * len(pile.cards)
+
+    def pile_at(self, x, y):
+        # The pile under point (x, y), or None
+        row = bisect_right(self.row_tops, y) - 1
+        if row < 0:
+            return None
+        column = bisect_right(self.row_lefts[row], x) - 1
+        if column < 0:
+            return None
+        pile = self.row_piles[row][column]
+        if x > pile.x + CARD_WIDTH or y > pile.bottom():
+            return None
+        return pile
+
+    def hit(self, x, y):
+        # (pile, card index) under point (x, y); the card index is None over an empty slot
+        pile = self.pile_at(x, y)
+        if pile is None:
+            return None, None
+        return pile, pile.card_at(y)
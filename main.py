@@ -1,11 +1,19 @@
+import time
+STARTED_AT = time.perf_counter()  # Start of the program, for the time-to-first-playable-frame report
 import pygame 
 import sys
 import os
-from classes import Game, Card
-import time
+from classes import ASSET_DIR, DRAW_MOVE, Game, Card
+from layout import Layout
+import assets
+import profiler
+from replay import ReplayWriter
+from savegame import AUTOSAVE_SLOT, QUICK_SLOT, SaveSlots
+from hints import HintService
+from pool import PoolService
+import debug_log
+from debug_log import logger
 import math
-# Initialize pygame
-pygame.init()
 
 # Screen dimensions and settings
 SCREEN_WIDTH = 1000
@@ -14,124 +22,297 @@ BACKGROUND_COLOR =  (0 , 0, 0 )  # Color for the background (green)
 FPS = 60  # Frames per second for the game
 CARD_WIDTH = 85  # Width of a card
 CARD_HEIGHT = 125  # Height of a card
-
-# Font for rendering text
-font = pygame.font.SysFont("Arial", 30)
-
-# Set up the display screen
-screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-pygame.display.set_caption('Solitaire')
-
-# Function to load images
-def load_image(file_path):
-    try:
-        image = pygame.image.load(file_path)  # Load the image from the specified path
-        return image
-    except pygame.error as e:
-        print(f"Error loading image '{file_path}': {e}")
-        return None
-
-# Load card back image and resize it
-card_back_image = load_image("C:/Users/3 Stars Laptop/Desktop/Game/cards/zback.png")
-if card_back_image:
-    card_back_image = pygame.transform.scale(card_back_image, (CARD_WIDTH , CARD_HEIGHT ))
-
-# Load mini logo image
-mini_image = pygame.image.load('C:/Users/3 Stars Laptop/Desktop/Game/images/logo-black.png')
-mini_image = pygame.transform.scale(mini_image, (50, 50))  # Resize the mini image
-
-# Initialize the game instance
-game = Game()
-
-# Function to draw a card on the screen
-def draw_card(card, x, y):
+INTRO_WIDTH, INTRO_HEIGHT = 700, 500  # Size of the intro window
+SAVE_DIR = os.path.join(ASSET_DIR, "saves")  # Where played games are kept
+REPLAY_PATH = os.path.join(SAVE_DIR, "replays.bin")  # Every game played, appended as it is played
+SAVE_PATH = os.path.join(SAVE_DIR, "slots.bin")  # Save slots: the autosave and the F5 quick save
+POOL_PATH = os.path.join(SAVE_DIR, "pool.bin")  # Winnable deals found ahead of time, dealt by New game
+
+# Images as (name, size) and fonts as (name, size, italic); they are fetched from the asset
+# registry, which loads, scales and converts each one only once
+CARD_BACK = ("cards/zback.png", (CARD_WIDTH, CARD_HEIGHT))
+EMPTY_SLOT = ("cards/empty_slot.png", (CARD_WIDTH, CARD_HEIGHT))
+MINI_LOGO = ("images/logo-black.png", (50, 50))
+BACKGROUND = ("images/bg.png", (SCREEN_WIDTH, SCREEN_HEIGHT))
+UNDO_ICON = ("images/undo.png", (40, 40))
+WINDOW_ICON = ("images/icon.png", (32, 42))
+INTRO_BACKGROUND = ("images/Cards.jfif", (INTRO_WIDTH, INTRO_HEIGHT))
+INTRO_LOGO = ("images/icon.png", (150, 100))
+IMAGES = [CARD_BACK, EMPTY_SLOT, MINI_LOGO, BACKGROUND, UNDO_ICON, WINDOW_ICON, INTRO_BACKGROUND, INTRO_LOGO]
+
+TIMER_FONT = ("Arial", 30, False)
+STATUS_FONT = ("Times New Roman", 30, True)
+MESSAGE_FONT = (None, 36, False)
+WIN_DETAIL_FONT = ("Arial", 24, False)
+INTRO_FONT = (None, 72, False)
+HUD_FONT = (None, 22, False)
+FONTS = [TIMER_FONT, STATUS_FONT, MESSAGE_FONT, WIN_DETAIL_FONT, INTRO_FONT, HUD_FONT]
+
+STOCK_SOUND = "images/stock_pile.mp3"
+DROP_SOUND = "images/move_card.mp3"
+WIN_SOUND = "images/win_game.mp3"
+POINTS_SOUND = "images/points_gain.mp3"
+INVALID_SOUND = "images/invalid_movement.mp3"
+SOUNDS = [STOCK_SOUND, DROP_SOUND, WIN_SOUND, POINTS_SOUND, INVALID_SOUND]
+
+EMPTY_TABLEAU_SHADE = ((CARD_WIDTH, CARD_HEIGHT), (0, 0, 0, 125))  # Semi-transparent overlay
+FOUNDATION_SHADE = ((CARD_WIDTH, CARD_HEIGHT), (255, 255, 255, 158))
+FLIGHT_FRAMES = 12  # Frames a card takes to fly to the foundation when it is played automatically
+FLIGHT_STAGGER = 2  # Frames between the starts of two cards flying in the same batch
+
+# The display surface, the game instance and the layout that positions its cards on screen.
+# They are set up by game_loop, so importing this module opens no window.
+screen = None
+game = None
+board_layout = None
+
+# Frame phase timings and blit counts; F3 shows them, SOLITAIRE_TRACE=<file> records a Chrome trace
+frame_profiler = profiler.from_environment()
+
+# Function to draw a card on the screen (or on another surface passed as target)
+def draw_card(card, x, y, target=None):
+    target = screen if target is None else target
+    frame_profiler.blits += 1
     if card.face_up:
-        screen.blit(card.card_image, (x, y))  # Draw the face-up card
+        target.blit(card.card_image, (x, y))  # Draw the face-up card
     else:
-        screen.blit(card_back_image, (x , y))  # Draw the face-down card
+        target.blit(assets.get_image(*CARD_BACK), (x , y))  # Draw the face-down card
 
 # Function to draw all tableau piles (the piles of cards in the game)
-def draw_tableau():
-    # Set x positions for the tableau piles
-    pile_x_positions = [100 + i * 125 for i in range(7)]
-    # Loop through each pile and draw its cards
-    for i, pile in game.tableau.piles.items():
-        cards = pile.display()
-        pile_x = pile_x_positions[i]
-        pile_y = 250
-        # If the pile is empty, draw an overlay and mini image
-        if pile.is_empty():
-            overlay = pygame.Surface((CARD_WIDTH, CARD_HEIGHT), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 125))  # Semi-transparent overlay
-            screen.blit(overlay, (pile_x, pile_y))  # Draw overlay
-            mini_image_x = pile_x + (CARD_WIDTH - mini_image.get_width()) // 2
-            mini_image_y = pile_y + (CARD_HEIGHT - mini_image.get_height()) // 2
-            screen.blit(mini_image, (mini_image_x, mini_image_y))  # Draw mini logo image
-        else:
-            # Draw each card in the pile with a slight offset
-            for j, card in enumerate(cards):
-                y_position = pile_y + j * 25
-                draw_card(card, pile_x, y_position)
+def draw_tableau(target=None):
+    for i in game.tableau.piles:
+        draw_tableau_pile(i, target)
+
+# Function to draw one tableau pile
+def draw_tableau_pile(i, target=None):
+    target = screen if target is None else target
+    pile = board_layout.piles[('tableau', i)]
+    # If the pile is empty, draw an overlay and mini image
+    if not pile.cards:
+        frame_profiler.blits += 2
+        target.blit(assets.get_overlay(*EMPTY_TABLEAU_SHADE), (pile.x, pile.y))  # Draw overlay
+        mini_image = assets.get_image(*MINI_LOGO)
+        mini_image_x = pile.x + (CARD_WIDTH - mini_image.get_width()) // 2
+        mini_image_y = pile.y + (CARD_HEIGHT - mini_image.get_height()) // 2
+        target.blit(mini_image, (mini_image_x, mini_image_y))  # Draw mini logo image
+    else:
+        # Draw each card in the pile at the position the layout gave it
+        for card, card_y in zip(pile.cards, pile.tops):
+            draw_card(card, pile.x, card_y, target)
 
 # Function to draw the stockpile and waste pile (cards that are face-down or moved to waste)
-def draw_stockpile():
-    stockpile_cards = game.stockpile.display()
-    waste_pile_cards = game.waste_pile.display()
-    empty_slot = load_image("C:/Users/3 Stars Laptop/Desktop/Game/cards/empty_slot.png")
-    empty_slot = pygame.transform.scale(empty_slot, (CARD_WIDTH, CARD_HEIGHT))
-
-    # Draw stockpile and waste pile cards
-    if stockpile_cards:
-        screen.blit(card_back_image, (50, 50))  # If stockpile has cards, show the back of the card
+def draw_stockpile(target=None):
+    draw_stock(target)
+    draw_waste(target)
+
+# Function to draw the stockpile: a card back, or an empty slot once it runs out
+def draw_stock(target=None):
+    target = screen if target is None else target
+    frame_profiler.blits += 1
+    if not game.stockpile.is_empty():
+        target.blit(assets.get_image(*CARD_BACK), (50, 50))  # If stockpile has cards, show the back of the card
     else:
-        screen.blit(empty_slot, (50, 50))  # If no cards, show an empty slot image
-    if waste_pile_cards:
-        top_waste_card = waste_pile_cards[-1]
-        draw_card(top_waste_card, 150, 50)  # Draw the top card from the waste pile
+        target.blit(assets.get_image(*EMPTY_SLOT), (50, 50))  # If no cards, show an empty slot image
 
-# Function to draw hints for valid moves
-def draw_hint(valid_moves):
+# Function to draw the top card of the waste pile
+def draw_waste(target=None):
+    pile = board_layout.piles[('waste', 0)]
+    if pile.cards:
+        draw_card(pile.cards[-1], pile.x, pile.y, target)  # Draw the top card from the waste pile
+
+# Function to draw hints for valid moves (move tuples from game.legal_moves() / game.hint)
+def draw_hint(valid_moves, target=None):
+    target = screen if target is None else target
     for move in valid_moves:
-        # Highlight tableau-to-foundation moves with yellow rectangle
-        if move[0] == 'tableau' and move[2] == 'foundation':
-            tableau_x = 100 + move[1] * 125
-            tableau_y = 250
-            pygame.draw.rect(screen, (255, 255, 0), (tableau_x, tableau_y, CARD_WIDTH, CARD_HEIGHT), 5)
-        # Highlight waste-to-tableau moves with yellow rectangle
-        elif move[0] == 'waste' and move[2] == 'tableau':
-            waste_x, waste_y = 150, 50
-            pygame.draw.rect(screen, (255, 255, 0), (waste_x, waste_y, CARD_WIDTH, CARD_HEIGHT), 5)
+        pygame.draw.rect(target, (255, 255, 0), hint_rect(move), 5)  # Highlight the card(s) that would move
+
+# Screen rectangle of the card(s) a move would pick up
+def hint_rect(move):
+    from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+    pile = board_layout.piles[(from_pile_name, from_index)]
+    if pile.name == 'tableau':
+        return pygame.Rect(pile.card_rect(len(pile.cards) - num_cards))  # First card of the moving run
+    return pygame.Rect(pile.x, pile.y, CARD_WIDTH, CARD_HEIGHT)  # Waste, foundation or stockpile draw
 
 # Function to draw the foundation piles (where cards are moved to build sequences)
-def draw_foundation():
-    # Set x positions for the foundation piles
-    foundation_x_positions = [450 + i * 125 for i in range(4)]
-    for i, pile in enumerate(game.foundation.piles):
-        pile_x = foundation_x_positions[i]
-        pile_y = 50
-        # Draw overlay for empty foundation piles
-        overlay = pygame.Surface((CARD_WIDTH, CARD_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((255, 255, 255, 158))
-        screen.blit(overlay, (pile_x, pile_y))
-        mini_image_x = pile_x + (CARD_WIDTH - mini_image.get_width()) // 2
-        mini_image_y = pile_y + (CARD_HEIGHT - mini_image.get_height()) // 2
-        screen.blit(mini_image, (mini_image_x, mini_image_y))  # Draw mini logo image
-        # If the pile has cards, draw the top card
-        if not pile.is_empty():
-            card = pile.peek()
-            draw_card(card, pile_x, pile_y)
+def draw_foundation(target=None):
+    for i in range(len(game.foundation.piles)):
+        draw_foundation_pile(i, target)
+
+# Function to draw one foundation pile
+def draw_foundation_pile(i, target=None):
+    pile = board_layout.piles[('foundation', i)]
+    draw_foundation_slot(pile.x, pile.y, pile.cards[-1] if pile.cards else None, target)
+
+# Function to draw a foundation slot with the given top card (None for an empty slot)
+def draw_foundation_slot(pile_x, pile_y, top, target=None):
+    target = screen if target is None else target
+    # Draw overlay for empty foundation piles
+    frame_profiler.blits += 2
+    target.blit(assets.get_overlay(*FOUNDATION_SHADE), (pile_x, pile_y))
+    mini_image = assets.get_image(*MINI_LOGO)
+    mini_image_x = pile_x + (CARD_WIDTH - mini_image.get_width()) // 2
+    mini_image_y = pile_y + (CARD_HEIGHT - mini_image.get_height()) // 2
+    target.blit(mini_image, (mini_image_x, mini_image_y))  # Draw mini logo image
+    # If the pile has cards, draw the top card
+    if top is not None:
+        draw_card(top, pile_x, pile_y, target)
+    else:
+        # Draw an empty rectangle if the foundation pile is empty
+        pygame.draw.rect(target, (50, 50, 50), (pile_x, pile_y, CARD_WIDTH, CARD_HEIGHT), 2)
+
+# Play the moves the player would always make after their move: the safe foundation moves, or the
+# whole rest of the game once it only needs finishing. Returns the cards to animate as
+# (card, start position, foundation slot, card below it on arrival or None); every move is recorded.
+def play_automatic_moves(replay_writer):
+    board_layout.update()
+    starts = {}  # Card code -> where the card is drawn now
+    for (name, i), pile in board_layout.piles.items():
+        if name in ('tableau', 'waste'):
+            for card, card_y in zip(pile.cards, pile.tops):
+                starts[card.code] = (pile.x, card_y)
+    waste = board_layout.piles[('waste', 0)]
+    heights = [len(pile.items) for pile in game.foundation.piles]
+    moves = game.finish_game() if game.can_finish() else None
+    if moves is None:
+        moves = game.auto_play()
+    flights = []
+    for move in moves:
+        replay_writer.move(move)
+        if move[2] != 'foundation':
+            continue  # A draw while finishing the game
+        slot = move[3]
+        items = game.foundation.piles[slot].items
+        card = items[heights[slot]]
+        flights.append((card, starts.get(card.code, (waste.x, waste.y)), slot, items[heights[slot] - 1] if heights[slot] else None))
+        heights[slot] += 1
+    return flights
+
+# Screen regions that hold cards, with what is drawn in each. A region is only redrawn when the
+# layout reports that its pile changed.
+def board_regions():
+    board_layout.update()
+    regions = []
+    for (name, i), pile in board_layout.piles.items():
+        if name == 'tableau':
+            rect = (pile.x, pile.y, CARD_WIDTH, SCREEN_HEIGHT - pile.y)  # The whole column, as the pile grows and shrinks
+            draw = lambda target, i=i: draw_tableau_pile(i, target)
+        elif name == 'foundation':
+            rect = (pile.x, pile.y, CARD_WIDTH, CARD_HEIGHT)
+            draw = lambda target, i=i: draw_foundation_pile(i, target)
         else:
-            # Draw an empty rectangle if the foundation pile is empty
-            pygame.draw.rect(screen, (50, 50, 50), (pile_x, pile_y, CARD_WIDTH, CARD_HEIGHT), 2)
-
-def starter_animation():
-    # Initialize pygame
-    pygame.init()
-
+            rect = (pile.x, pile.y, CARD_WIDTH, CARD_HEIGHT)
+            draw = draw_stock if name == 'stock' else draw_waste
+        regions.append(((name, i), rect, pile.signature, frame_profiler.timed(f"draw_{name}", draw)))
+    return regions
+
+class DirtyRenderer:
+    # Draws the game by only touching the parts of the screen that changed.
+    # board:  static layer (background, buttons) drawn once
+    # scene:  board plus every card at rest; a pile region is redrawn here only when it changes
+    # screen: scene plus overlays (timer/score text, messages, dragged cards) drawn every frame
+    # Dirty rectangles are copied from the scene to the screen and pushed with display.update(rects).
+    def __init__(self, screen, board):
+        self.screen = screen
+        self.board = board
+        self.scene = board.copy()
+        self.signatures = {}  # Region key -> signature drawn last
+        self.overlays = {}  # Key -> (value, rect, draw function) for this frame
+        self.shown = {}  # Key -> (value, rect) of the overlays on screen now
+        self.dirty = [screen.get_rect()]
+
+    def update_scene(self, regions):
+        # Redraw the regions whose signature changed since they were last drawn
+        for key, rect, signature, draw in regions:
+            if self.signatures.get(key) != signature:
+                self.signatures[key] = signature
+                rect = pygame.Rect(rect)
+                self.scene.set_clip(rect)
+                self.scene.blit(self.board, rect, rect)
+                frame_profiler.blits += 1
+                draw(self.scene)
+                self.scene.set_clip(None)
+                self.dirty.append(rect)
+
+    def overlay(self, key, value, rect, draw):
+        # Draw something on top of the scene this frame; it only costs a redraw when value or rect change
+        self.overlays[key] = (value, pygame.Rect(rect), draw)
+
+    def text(self, key, text, font, color, position):
+        # Text overlay; rendered strings come from the asset registry's text cache
+        surface = assets.render_text(text, font, color)
+        def draw_text(target):
+            frame_profiler.blits += 1
+            target.blit(surface, position)
+        self.overlay(key, text, surface.get_rect(topleft=position), draw_text)
+
+    def render(self):
+        # Work out what changed, restore it from the scene, redraw overlays over it and push only those rects
+        for key, (value, rect) in self.shown.items():
+            current = self.overlays.get(key)
+            if current is None or current[0] != value or current[1] != rect:
+                self.dirty.append(rect)  # Where the overlay used to be
+        for key, (value, rect, draw) in self.overlays.items():
+            if self.shown.get(key) != (value, rect):
+                self.dirty.append(rect)  # Where the overlay is now
+        # An overlay touching a dirty area is redrawn whole, so all of it has to be restored first
+        grown = True
+        while grown:
+            grown = False
+            for value, rect, draw in self.overlays.values():
+                if rect.collidelist(self.dirty) != -1 and not any(area.contains(rect) for area in self.dirty):
+                    self.dirty.append(rect)
+                    grown = True
+        if self.dirty:
+            for rect in self.dirty:
+                self.screen.blit(self.scene, rect, rect)
+            frame_profiler.blits += len(self.dirty)
+            for value, rect, draw in self.overlays.values():
+                if rect.collidelist(self.dirty) != -1:
+                    draw(self.screen)
+            pygame.display.update(self.dirty)
+        self.shown = {key: (value, rect) for key, (value, rect, draw) in self.overlays.items()}
+        self.overlays = {}
+        self.dirty = []
+
+    def invalidate(self):
+        # Force a full redraw on the next frame (e.g. after something else drew over the screen)
+        self.scene = self.board.copy()
+        self.signatures = {}
+        self.dirty = [self.screen.get_rect()]
+
+class FrameScheduler:
+    # Paces the game loop. While something moves on screen (a drag or an animation) frames run at
+    # a capped rate; otherwise the loop sleeps in pygame.event.wait until input arrives or the next
+    # deadline (e.g. the timer text ticking over a second), so an idle game uses almost no CPU.
+    def __init__(self, fps=FPS):
+        self.clock = pygame.time.Clock()
+        self.fps = fps
+
+    def wait(self, busy, wake_at=None):
+        # Return the events for the next frame. `wake_at` is a time.time() deadline for an idle wait.
+        if busy:
+            self.clock.tick(self.fps)  # Sleep out the rest of the frame, then take whatever came in
+            return pygame.event.get()
+        if wake_at is None:
+            event = pygame.event.wait()  # Nothing scheduled: sleep until there is input
+        else:
+            timeout = int((wake_at - time.time()) * 1000)
+            if timeout <= 0:
+                self.clock.tick()
+                return pygame.event.get()
+            event = pygame.event.wait(timeout)
+        self.clock.tick()  # Keep the clock's frame time current for when we are busy again
+        if event.type == pygame.NOEVENT:
+            return []  # Timed out: the deadline is due
+        return [event] + pygame.event.get()
+
+# Intro shown in the window opened by game_loop. With `loading` (a Future for the background
+# asset load) it ends as soon as loading is done; a key press or click skips it in any case.
+def starter_animation(loading=None):
     # Screen settings
-    WIDTH, HEIGHT = 700, 500  # Adjust screen size as needed
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("Klondike Solitaire")
+    WIDTH, HEIGHT = INTRO_WIDTH, INTRO_HEIGHT
+    screen = pygame.display.get_surface()
 
     # Colors
     BACKGROUND_COLOR = (59, 27, 77)
@@ -139,16 +320,12 @@ def starter_animation():
     GLOW_COLOR = (255, 255, 255)  # Glow color (white)
     SHADOW_COLOR = (0, 0, 0)  # Black shadow for text
 
-    # Load background image
-    background_image = pygame.image.load("C:/Users/3 Stars Laptop/Desktop/Game/images/cards.jfif")
-    background_image = pygame.transform.scale(background_image, (WIDTH, HEIGHT))  # Resize as needed
-
-    # Load mini logo image
-    mini_image = pygame.image.load("C:/Users/3 Stars Laptop/Desktop/Game/images/icon.png")
-    mini_image = pygame.transform.scale(mini_image, (150, 100))  # Resize mini image
+    # Background and mini logo images, already scaled to size
+    background_image = assets.get_image(*INTRO_BACKGROUND)
+    mini_image = assets.get_image(*INTRO_LOGO)
 
     # Text settings
-    font = pygame.font.Font(None, 72)  # You can also use a custom font file here
+    font = assets.get_font(*INTRO_FONT)
     full_text = "Klondike Solitaire "
     displayed_text = ""
     typewriter_speed = 150  # Delay between characters in milliseconds
@@ -171,6 +348,8 @@ def starter_animation():
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
+            if event.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+                running = False  # Skip the intro
 
         # Display background image
         screen.blit(background_image, (0, 0))
@@ -190,9 +369,9 @@ def starter_animation():
                 last_time = current_time  # Update last_time to current time
 
         # Create glow and shadow effects for the text
-        text_surface = font.render(displayed_text, True, TEXT_COLOR)
-        shadow_surface = font.render(displayed_text, True, SHADOW_COLOR)  # Shadow effect
-        glow_surface = font.render(displayed_text, True, GLOW_COLOR)  # Glow effect
+        text_surface = assets.render_text(displayed_text, font, TEXT_COLOR)
+        shadow_surface = assets.render_text(displayed_text, font, SHADOW_COLOR)  # Shadow effect
+        glow_surface = assets.render_text(displayed_text, font, GLOW_COLOR)  # Glow effect
 
         # Adjust text position
         text_y_position = HEIGHT // 1.5  # Move text lower
@@ -208,8 +387,11 @@ def starter_animation():
         if fade_alpha == 255 and text_index == len(full_text):
             animation_complete = True
 
-        # End the screen after the animation is complete
-        if animation_complete:
+        # End the screen once the assets are loaded (or, without a loader, after the animation)
+        if loading is not None:
+            if loading.done():
+                running = False
+        elif animation_complete:
             pygame.time.wait(1000)  # Wait for 1 second before closing the window (optional)
             running = False  # Exit the loop to close the window
 
@@ -219,138 +401,172 @@ def starter_animation():
 
                    
 def game_loop():
-    starter_animation()
+    global screen, game, board_layout
+    hints = HintService() # hint search worker, started before pygame so it shares nothing with the display
+    deals = PoolService(POOL_PATH) # winnable deal producer, likewise
+    pygame.init()
+    pygame.display.set_mode((INTRO_WIDTH, INTRO_HEIGHT))
+    pygame.display.set_caption("Klondike Solitaire")
+    # Cards, images, fonts and sounds load on a worker thread while the intro plays
+    loading = assets.preload_in_background(IMAGES, FONTS, SOUNDS)
+    starter_animation(loading)
+    loading.result()  # If the intro was skipped, finish loading before the first frame
     #initialize variables
-    game.save_state()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    assets.convert_pending() # the loader thread left its images in their file format
     pygame.display.set_caption('Solitaire')
+    saves = SaveSlots(SAVE_PATH)
+    replay_writer = ReplayWriter(REPLAY_PATH)
+    score = 0 
+    move_count = 0
+    elapsed_time = 0
+    resumed = saves.load(AUTOSAVE_SLOT) # the game still in progress when the player last quit, if any
+    if resumed is not None and not resumed[0].check_win():
+        game, score, move_count, elapsed_time = resumed # a resumed game does not start from its deal, so it is not recorded
+    else:
+        game = deals.new_game() or Game() # a random deal while the pool is still empty
+        replay_writer.begin_game(game)
+    board_layout = Layout(game)
+    saved_move_count = move_count # move count at the last autosave
+    auto_play_pending = resumed is None # safe moves are played after every move of the player, and on a new deal
+    flights = [] # cards flying to the foundation, see play_automatic_moves
+    flight_frame = 0 # frames since the flights took off
+    flight_history = 0 # length of the move history when they took off
     dragging_cards = [] 
     dragging_pile_name = None
     dragging_pile_index = None
     offset_x, offset_y = 0, 0
-    global font
-    score = 0 
-    move_count = 0
-    clock = pygame.time.Clock()
-    start_time = time.time()
+    scheduler = FrameScheduler(FPS)
+    start_time = time.time() - elapsed_time
+    wake_at = start_time  # Draw the first frame straight away
+    first_frame = True
     running = True
-    message_time = None
+    message_time = None # time.time() when the message on screen was shown; it goes away 10 seconds later
     invalid_move_message = ""
-    # Load images and sounds
-    undo_image = load_image("C:/Users/3 Stars Laptop/Desktop/Game/images/undo.png")
-    card_click_sound = pygame.mixer.Sound("C:/Users/3 Stars Laptop/Desktop/Game/images/stock_pile.mp3")
-    card_drop_sound = pygame.mixer.Sound("C:/Users/3 Stars Laptop/Desktop/Game/images/move_card.mp3")
-    win_game = pygame.mixer.Sound("C:/Users/3 Stars Laptop/Desktop/Game/images/win_game.mp3")
-    point_gain = pygame.mixer.Sound("C:/Users/3 Stars Laptop/Desktop/Game/images/points_gain.mp3")
-    invalid_movement = pygame.mixer.Sound("C:/Users/3 Stars Laptop/Desktop/Game/images/invalid_movement.mp3")
-    icon_image = pygame.image.load("C:/Users/3 Stars Laptop/Desktop/Game/images/icon.png")
-    icon_image = pygame.transform.scale(icon_image, (32, 42))
-    pygame.display.set_icon(icon_image)
-    # Main game loop
-    background_image = pygame.image.load("C:/Users/3 Stars Laptop/Desktop/Game/images/bg.png")
-    background_image = pygame.transform.scale(background_image, (SCREEN_WIDTH, SCREEN_HEIGHT))
+    # Everything is loaded by now; the frame loop only looks assets up
+    card_click_sound = assets.get_sound(STOCK_SOUND)
+    card_drop_sound = assets.get_sound(DROP_SOUND)
+    win_game = assets.get_sound(WIN_SOUND)
+    point_gain = assets.get_sound(POINTS_SOUND)
+    invalid_movement = assets.get_sound(INVALID_SOUND)
+    pygame.display.set_icon(assets.get_image(*WINDOW_ICON))
+    timer_font = assets.get_font(*TIMER_FONT)
+    status_font = assets.get_font(*STATUS_FONT)
+    message_font = assets.get_font(*MESSAGE_FONT)
+    background_image = assets.get_image(*BACKGROUND)
+    undo_image = assets.get_image(*UNDO_ICON)
+    redo_image = pygame.transform.flip(undo_image, True, False)  # Mirrored undo icon
+    # Static board layer: drawn once and reused by the renderer every frame
+    board = background_image.convert()  # Opaque copy in the screen's pixel format
+    board.blit(undo_image, (900, 10))
+    board.blit(redo_image, (950, 10))
+    renderer = DirtyRenderer(screen, board)
+    hud_font = assets.get_font(*HUD_FONT)
     while running:
-        # screen.fill(BACKGROUND_COLOR)
-        screen.blit(background_image, (0, 0))
-        elapsed_time = time.time() - start_time
-        minutes = int(elapsed_time // 60)
-        seconds = int(elapsed_time % 60)
-        time_text = f"{minutes:02}:{seconds:02}"
-        time_display = font.render(time_text, True, (255, 255, 255))
-        screen.blit(time_display, (80, 15))
-        score_text = f"Score: {score}" # Score display
-        score_display = pygame.font.SysFont("Times New Roman", 30 ,italic=True ).render(score_text, True, (255, 255, 255))
-        screen.blit(score_display, ( 750 , 10))
-        moves_text = f"Moves: {move_count}" # Moves display
-        score_display = pygame.font.SysFont("Times New Roman", 30 ,italic=True ).render(moves_text, True, (255, 255, 255))
-        screen.blit(score_display, ( 600 , 10)) 
-        undo_image = pygame.transform.scale(undo_image, (40, 40))
-        screen.blit(undo_image, (900, 10)) 
+        events = scheduler.wait(bool(dragging_cards) or bool(flights) or hints.searching(), wake_at) # idle time is not part of the frame
         if message_time and time.time() - message_time >= 10:
-            invalid_move_message = "" 
-            
-        for event in pygame.event.get(): # Event handling loop 
+            invalid_move_message = ""
+            message_time = None
+        frame_profiler.begin_frame()
+        frame_profiler.start("events")
+        for event in events: # Event handling loop 
             if event.type == pygame.QUIT: # if cross btn is pressed
                 running = False
+
+            if event.type in (pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED, pygame.VIDEOEXPOSE): # the window was covered or minimized
+                renderer.invalidate() # repaint all of it, not just the dirty rectangles
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3: # F3 shows / hides the profiling HUD
+                frame_profiler.toggle_hud()
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_h: # H asks for a hint, searched in the background
+                hints.request(game)
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_n: # N deals a new game, a winnable one from the pool if one is ready
+                game = deals.new_game()
+                invalid_move_message = "New game" if game is not None else "New game (no winnable deal ready yet)"
+                message_time = time.time()
+                game = game or Game()
+                replay_writer.begin_game(game)
+                board_layout = Layout(game)
+                score, move_count = 0, 0
+                saved_move_count = -1 # autosave the new game
+                start_time = time.time()
+                dragging_cards = []
+                flights = []
+                auto_play_pending = True
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F5: # F5 saves the game to the quick save slot
+                saves.save(QUICK_SLOT, game, score, move_count, time.time() - start_time)
+                invalid_move_message = "Game saved"
+                message_time = time.time()
+
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F9: # F9 goes back to the quick save
+                loaded = saves.load(QUICK_SLOT)
+                if loaded is None:
+                    invalid_move_message = "No saved game"
+                    message_time = time.time()
+                else:
+                    game, score, move_count, elapsed_time = loaded
+                    board_layout = Layout(game)
+                    start_time = time.time() - elapsed_time
+                    replay_writer.end_game() # the loaded position is not part of the recorded game
+                    hints.cancel()
+                    dragging_cards = []
+                    invalid_move_message = "Game loaded"
+                    message_time = time.time()
+
+            if event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL: # keyboard undo / redo
+                if event.key == pygame.K_z and game.undo(): # Ctrl+Z undoes the last move
+                    replay_writer.undo()
+                    move_count += 1
+                elif event.key == pygame.K_y and game.redo(): # Ctrl+Y redoes the last undone move
+                    replay_writer.redo()
+                    move_count += 1
   
             if event.type == pygame.MOUSEBUTTONDOWN: # if mouse is clicked ( user select the card)
                 pos = pygame.mouse.get_pos()
                 if SCREEN_WIDTH - 100 <= pos[0] <= SCREEN_WIDTH - 100 + 40 and 15 <= pos[1] <= 15 + 40:
                      if (game.undo()): # if undo btn is clicked
+                        replay_writer.undo()
+                        move_count += 1
+                if SCREEN_WIDTH - 50 <= pos[0] <= SCREEN_WIDTH - 50 + 40 and 15 <= pos[1] <= 15 + 40:
+                     if (game.redo()): # if redo btn is clicked
+                        replay_writer.redo()
                         move_count += 1
-                if 50 <= pos[0] <= 50 + CARD_WIDTH and 50 <= pos[1] <= 50 + CARD_HEIGHT: # if stockpile is clicked
-                    game.draw_from_stockpile() # draw card from stockpile
+                board_layout.update()
+                pile, card_index = board_layout.hit(*pos) # what is under the pointer
+                if pile is not None and pile.name == 'stock': # if stockpile is clicked
+                    if game.apply_move(DRAW_MOVE) == "": # draw card from stockpile (or turn the waste pile over)
+                        replay_writer.move(DRAW_MOVE)
+                        auto_play_pending = True
                     card_click_sound.play()
                     move_count += 1 # increment move count
-                elif 150 <= pos[0] <= 150 + CARD_WIDTH and 50 <= pos[1] <= 50 + CARD_HEIGHT: # if waste pile is clicked
-                    if game.waste_pile.top_card() is not None:
-                        dragging_cards = [game.waste_pile.top_card()]
-                        offset_x, offset_y = pos[0] - 150, pos[1] - 50
-                        dragging_pile_name, dragging_pile_index = 'waste', -1 # from waste pile
-                pile_x_positions = [100 + i * 125 for i in range(7)]  # x positions for tableau piles
-                for pile_idx, pile in game.tableau.piles.items():
-                    if not pile.is_empty():
-                        for j, card in enumerate(pile.display()): # loop through each card in the pile
-                            card_x = pile_x_positions[pile_idx]
-                            card_y = 250 + j * 25
-                            if card.face_up:
-                                if card_x <= pos[0] <= card_x + CARD_WIDTH and card_y <= pos[1] <= card_y + CARD_HEIGHT: # if card is clicked
-                                    dragging_cards = []
-                                    dragging_pile_name, dragging_pile_index = 'tableau', pile_idx # from tableau pile
-                                    offset_x = pos[0] - card_x
-                                    offset_y = pos[1] - card_y
-                                    for k in range(j, len(pile.display())):
-                                        if pile.display()[k].face_up: 
-                                            dragging_cards.append(pile.display()[k])
-                                            print("Dragging cards in if loop line 148 ", len(dragging_cards)) # print the length of dragging cards
-                                        else:
-                                            break 
-                                    break
-
-                foundation_x_positions = [450 + i * 125 for i in range(4)] # x positions for foundation piles
-                for foundation_idx, foundation_pile in enumerate(game.foundation.piles): # loop through each foundation pile
-                    if not foundation_pile.is_empty():
-                        top_card = foundation_pile.peek() # get the top card of the foundation pile
-                        card_x = foundation_x_positions[foundation_idx]
-                        card_y = 50
-                        if card_x <= pos[0] <= card_x + CARD_WIDTH and card_y <= pos[1] <= card_y + CARD_HEIGHT: # if card is clicked
-                            dragging_cards = [top_card]
-                            print ("Dragging cards in foundation", len(dragging_cards))
-                            dragging_pile_name, dragging_pile_index = 'foundation', foundation_idx  # from foundation pile
-                            offset_x = pos[0] - card_x
-                            offset_y = pos[1] - card_y
-                            break
+                elif card_index is not None and pile.cards[card_index].face_up: # a face-up card is picked up
+                    dragging_cards = pile.cards[card_index:] # the card and every card on top of it
+                    dragging_pile_name = pile.name
+                    dragging_pile_index = -1 if pile.name == 'waste' else pile.index
+                    offset_x = pos[0] - pile.x
+                    offset_y = pos[1] - pile.tops[card_index]
+                    if debug_log.enabled:
+                        logger.debug("Picked up %d %s card(s)", len(dragging_cards), pile.name)
 
             if event.type == pygame.MOUSEBUTTONUP and dragging_cards: # if mouse is released
                 pos = pygame.mouse.get_pos()
                 drop_pile_name, drop_pile_index = None, None
-                for pile_idx, pile in game.tableau.piles.items(): # loop through each tableau pile
-                    cards = pile.display()
-                    pile_x = 100 + pile_idx * 125
-                    if pile_x <= pos[0] <= pile_x + CARD_WIDTH:
-                        if not cards:
-                            print(f"Dropped on empty tableau pile {pile_idx}") # if tableau pile is empty
-                            drop_pile_name, drop_pile_index = 'tableau', pile_idx 
-                        else:
-                            for j, card in enumerate(cards):
-                                if card.face_up:
-                                    card_y = 250 + j * 25
-                                    if card_y <= pos[1] <= card_y + CARD_HEIGHT:
-                                        print("Dragging cards in if loop line 182 ", len(dragging_cards)) # print the length of dragging cards
-                                        drop_pile_name, drop_pile_index = 'tableau', pile_idx
-                                        offset_x = pos[0] - pile_x
-                                        offset_y = pos[1] - card_y
-                                        break
-                for foundation_idx in range(4): # loop through each foundation pile
-                    if foundation_x_positions[foundation_idx] <= pos[0] <= foundation_x_positions[foundation_idx] + CARD_WIDTH:
-                        if 50 <= pos[1] <= 50 + CARD_HEIGHT:
-                            drop_pile_name, drop_pile_index = 'foundation', foundation_idx # if foundation pile is clicked
-                            print(f"Dropped on foundation pile {foundation_idx}")
-                            break
-                print(len(dragging_cards) , "dragging cards") # print the length of dragging cards
+                board_layout.update()
+                pile, card_index = board_layout.hit(*pos) # pile the cards are dropped on
+                if pile is not None and pile.name in ('tableau', 'foundation'):
+                    drop_pile_name, drop_pile_index = pile.name, pile.index
+                    if debug_log.enabled:
+                        logger.debug("Dropped %d card(s) on %s pile %d", len(dragging_cards), pile.name, pile.index)
+                if debug_log.enabled:
+                    logger.debug("Moving %d dragged card(s)", len(dragging_cards))
                 invalid_move_message = game.move_cards(dragging_pile_name, dragging_pile_index, drop_pile_index, drop_pile_name, len(dragging_cards)) # move the cards
                 if invalid_move_message == "":
+                    replay_writer.move((dragging_pile_name, dragging_pile_index, drop_pile_name, drop_pile_index, len(dragging_cards)))
                     move_count += 1 # increment move count
+                    auto_play_pending = True
                     
                     card_drop_sound.play()
                     if drop_pile_name == "tableau": # if card is dropped on tableau pile
@@ -359,6 +575,7 @@ def game_loop():
                         score += 15
                 else:
                     invalid_movement.play() # invalid sound play 
+                    message_time = time.time()
                     
 
                 dragging_cards = [] 
@@ -368,27 +585,107 @@ def game_loop():
                 drop_pile_name = None
                 
 
-
-        draw_tableau() # draw tableau
-        draw_stockpile() # draw stockpile
-        draw_foundation() # draw foundation
+        if auto_play_pending: # the safe moves that follow the player's move, played as one batch
+            auto_play_pending = False
+            new_flights = play_automatic_moves(replay_writer)
+            if new_flights:
+                score += 15 * len(new_flights) # as if each card had been dropped on the foundation
+                flights, flight_frame, flight_history = new_flights, 0, game.move_history.size()
+        if flights and (game.move_history.size() != flight_history or
+                        flight_frame > (len(flights) - 1) * FLIGHT_STAGGER + FLIGHT_FRAMES):
+            flights = [] # landed, or the board changed under them (undo, a loaded game)
+        if move_count != saved_move_count: # autosave after every move (a few microseconds)
+            saves.save(AUTOSAVE_SLOT, game, score, move_count, time.time() - start_time)
+            saved_move_count = move_count
+            hints.cancel() # a hint for the old position is no use
+        deals.poll() # file away the winnable deals the producer has found
+        hint_move = hints.poll() # best move the hint search has found so far, if a hint was asked for
+        if hint_move is None and hints.status is not None and not hints.searching():
+            invalid_move_message = "No moves to hint"
+            message_time = time.time()
+            hints.cancel()
+        frame_profiler.stop()
+
+        frame_profiler.start("scene")
+        renderer.update_scene(board_regions()) # redraw only the piles that changed
+        frame_profiler.stop()
+        frame_profiler.start("overlays")
+        elapsed_time = time.time() - start_time
+        minutes = int(elapsed_time // 60)
+        seconds = int(elapsed_time % 60)
+        renderer.text('time', f"{minutes:02}:{seconds:02}", timer_font, (255, 255, 255), (80, 15))
+        renderer.text('score', f"Score: {score}", status_font, (255, 255, 255), (750, 10)) # Score display
+        renderer.text('moves', f"Moves: {move_count}", status_font, (255, 255, 255), (600, 10)) # Moves display
         if invalid_move_message:
-            message_font = pygame.font.SysFont(None, 36) # message font
-            text = message_font.render(invalid_move_message, True, (255, 255, 255))
             message_rect = pygame.Rect(10, SCREEN_HEIGHT - 50, len(invalid_move_message) * 20, 40) # message rect
-            pygame.draw.rect(screen, (0 , 0, 0 , 200), message_rect, border_radius=10)
-            screen.blit(text, (message_rect.x + 10, message_rect.y + 10)) 
+            def draw_message(target, message=invalid_move_message, message_rect=message_rect):
+                text = assets.render_text(message, message_font, (255, 255, 255))
+                pygame.draw.rect(target, (0 , 0, 0 , 200), message_rect, border_radius=10)
+                target.blit(text, (message_rect.x + 10, message_rect.y + 10))
+                frame_profiler.blits += 1
+            renderer.overlay('message', invalid_move_message, message_rect, draw_message)
 
         if dragging_cards:
             pos = pygame.mouse.get_pos() # get the mouse position
-            for idx, card in enumerate(dragging_cards):
-                draw_card(card, pos[0] - offset_x, pos[1] - offset_y + idx * 25) # draw the card
-        if game.check_win():  # check if game is finished
+            drag_x, drag_y = pos[0] - offset_x, pos[1] - offset_y
+            def draw_dragging(target, cards=tuple(dragging_cards), drag_x=drag_x, drag_y=drag_y):
+                for idx, card in enumerate(cards):
+                    draw_card(card, drag_x, drag_y + idx * 25, target) # draw the card
+            drag_rect = (drag_x, drag_y, CARD_WIDTH, CARD_HEIGHT + (len(dragging_cards) - 1) * 25)
+            renderer.overlay('drag', (drag_x, drag_y, tuple(dragging_cards)), drag_rect, draw_dragging)
+        if hint_move is not None:
+            rect = hint_rect(hint_move)
+            renderer.overlay('hint', (hint_move, tuple(rect)), rect, lambda target, move=hint_move: draw_hint([move], target))
+        if flights:
+            shown_below = {} # foundation slot -> card it shows until the first card still flying there lands
+            for index, (card, start, slot, below) in enumerate(flights):
+                if flight_frame - index * FLIGHT_STAGGER < FLIGHT_FRAMES:
+                    shown_below.setdefault(slot, below)
+            for slot, below in shown_below.items():
+                slot_x, slot_y = board_layout.piles[('foundation', slot)].x, board_layout.piles[('foundation', slot)].y
+                slot_rect = pygame.Rect(slot_x, slot_y, CARD_WIDTH, CARD_HEIGHT)
+                def draw_slot(target, slot_rect=slot_rect, below=below):
+                    target.blit(renderer.board, slot_rect, slot_rect)
+                    draw_foundation_slot(slot_rect.x, slot_rect.y, below, target)
+                renderer.overlay(('landing', slot), below, slot_rect, draw_slot)
+            for index in reversed(range(len(flights))): # the first cards to leave are drawn on top
+                card, (start_x, start_y), slot, below = flights[index]
+                progress = (flight_frame - index * FLIGHT_STAGGER) / FLIGHT_FRAMES
+                if progress < 1:
+                    progress = max(progress, 0)
+                    end = board_layout.piles[('foundation', slot)]
+                    card_x = round(start_x + (end.x - start_x) * progress)
+                    card_y = round(start_y + (end.y - start_y) * progress)
+                    renderer.overlay(('flight', index), (card.code, card_x, card_y), (card_x, card_y, CARD_WIDTH, CARD_HEIGHT),
+                                     lambda target, card=card, card_x=card_x, card_y=card_y: draw_card(card, card_x, card_y, target))
+            flight_frame += 1
+        if frame_profiler.hud:
+            hud_lines = tuple(frame_profiler.hud_lines())
+            def draw_hud(target, hud_lines=hud_lines):
+                pygame.draw.rect(target, (0, 0, 0), (10, 60, 420, 10 + 20 * len(hud_lines)))
+                for line_index, line in enumerate(hud_lines):
+                    target.blit(assets.render_text(line, hud_font, (0, 255, 0)), (15, 65 + 20 * line_index))
+                frame_profiler.blits += len(hud_lines)
+            renderer.overlay('hud', hud_lines, (10, 60, 420, 10 + 20 * len(hud_lines)), draw_hud)
+        frame_profiler.stop()
+        frame_profiler.start("render")
+        renderer.render() # push only the changed rectangles to the display
+        frame_profiler.stop()
+        if first_frame:
+            first_frame = False
+            # Reported on stderr so it shows up without debug logging
+            print(f"First playable frame after {time.perf_counter() - STARTED_AT:.3f}s", file=sys.stderr)
+        frame_profiler.start("check_win")
+        won = not flights and game.check_win() # the win screen waits for the last card to land
+        frame_profiler.stop()
+        frame_profiler.end_frame()
+        if won:  # check if game is finished
             win_message = "You Win!"
             win_game.play()  # game won sound play
+            replay_writer.end_game()  # the finished game is on disk before the win screen
+            saves.clear(AUTOSAVE_SLOT)  # nothing to resume next time
 
-            message_font = pygame.font.SysFont(None, 36)  # message font
-            win_text = message_font.render(f"            {win_message}", True, (255, 255, 255))  # White text
+            win_text = assets.render_text(f"            {win_message}", message_font, (255, 255, 255))  # White text
             text_width = win_text.get_width()  # get the width of the text
             text_height = win_text.get_height()  # get the height of the text
 
@@ -399,8 +696,9 @@ def game_loop():
 
             moves_text = f"Moves: {move_count}"
             score_text = f"Score: {score}"
-            time_display = pygame.font.SysFont("Arial", 24).render(time_text, True, (255, 255, 255))  # White text for time display
-            moves_score_text = pygame.font.SysFont("Arial", 24).render(f"    {moves_text}      {score_text}", True, (255, 255, 255))  # White text for moves and score display
+            detail_font = assets.get_font(*WIN_DETAIL_FONT)
+            time_display = assets.render_text(time_text, detail_font, (255, 255, 255))  # White text for time display
+            moves_score_text = assets.render_text(f"    {moves_text}      {score_text}", detail_font, (255, 255, 255))  # White text for moves and score display
 
             total_width = max(text_width, moves_score_text.get_width()) + 100  # total width
             total_height = text_height + moves_score_text.get_height() + time_display.get_height() + 80  # total height
@@ -420,9 +718,15 @@ def game_loop():
             pygame.time.wait(60000)  # wait for 60 seconds
             break  
 
-        pygame.display.flip()
-        clock.tick(FPS) # set the frames per second
-        pygame.time.Clock().tick(30) # set the frames per second
+        # When idle, sleep until the timer text next changes (or a message expires) unless input comes first
+        wake_at = start_time + int(time.time() - start_time) + 1
+        if message_time:
+            wake_at = min(wake_at, message_time + 10)
+    replay_writer.close() # finish the game's replay
+    saves.close()
+    hints.close()
+    deals.close()
+    frame_profiler.close() # write the trace, if one was asked for
     pygame.quit() # quit the game
     sys.exit() # exit the game
 
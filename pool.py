@@ -0,0 +1,242 @@
+import argparse
+import multiprocessing
+import os
+import random
+import struct
+import sys
+import time
+from array import array
+from classes import Game
+from replay import decode_action, encode_move
+import solver
+
+# Pool of deals known to be winnable, for a "winnable deals only" game. A producer process deals
+# random deal numbers, keeps the ones a bounded solve wins and sends them with their winning line
+# to the game, which appends them to the pool file; "New game" takes the oldest deal from the pool
+# without any solving. The file is a log that only the game (one process) writes:
+#
+#   file header  b"SOLP", version (1 byte), 3 reserved bytes
+#   record       kind (1 byte), flags (1 byte): bit 0 = draw-3, deal number (8 bytes, little-endian)
+#   kind 1       a deal was added; followed by the number of moves (2 bytes) and the moves as
+#                2-byte replay action codes (see replay.encode_move)
+#   kind 2       the deal was taken
+#
+# Taken deals are dropped from the file when it is opened once they outnumber the waiting ones.
+# The pool is only a cache: a file that cannot be read is set aside (renamed to .bad) and the pool
+# starts again empty, and a record cut short at the end is cut off.
+
+MAGIC = b"SOLP"
+VERSION = 1
+FILE_HEADER = MAGIC + bytes([VERSION, 0, 0, 0])
+RECORD = struct.Struct("<BBQ")
+MOVE_COUNT = struct.Struct("<H")
+ADDED = 1
+TAKEN = 2
+DRAW_THREE = 1
+POOL_SIZE = 20  # Deals the producer keeps ready
+REFILL_AT = 5  # The producer is woken up when fewer deals than this are ready
+MAX_NODES = 20000  # Node budget of the solve that checks a deal; deals over budget are skipped
+
+class DealPool:
+    # The pool file, with the waiting deals in memory: (deal number, draw count) -> winning moves
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.deals = {}  # In the order they were added; dicts keep insertion order
+        taken = 0
+        if os.path.exists(path):
+            with open(path, "rb") as file:
+                data = file.read()
+            if data[:len(FILE_HEADER)] != FILE_HEADER:
+                if data:  # An empty file is one the game died creating: nothing to keep
+                    os.replace(path, path + ".bad")
+                    print(f"{path} is not a deal pool file of version {VERSION}; moved it to {path}.bad "
+                          f"and started a new pool", file=sys.stderr)
+                else:
+                    os.remove(path)
+            else:
+                taken, end = self.read_records(data)
+                if end < len(data):
+                    with open(path, "r+b") as file:
+                        file.truncate(end)  # Drop the record the game died writing
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER)
+            self.file.flush()
+        elif taken > len(self.deals):
+            self.compact()
+
+    def read_records(self, data):
+        # Replay the log into self.deals; returns (number of taken deals, offset just past the last
+        # whole record). A record cut short (the game died while writing it) ends the log.
+        position = end = len(FILE_HEADER)
+        taken = 0
+        while position + RECORD.size <= len(data):
+            kind, flags, seed = RECORD.unpack_from(data, position)
+            position += RECORD.size
+            key = (seed, 3 if flags & DRAW_THREE else 1)
+            if kind == TAKEN:
+                self.deals.pop(key, None)
+                taken += 1
+                end = position
+                continue
+            if position + MOVE_COUNT.size > len(data):
+                break
+            count, = MOVE_COUNT.unpack_from(data, position)
+            position += MOVE_COUNT.size
+            if position + 2 * count > len(data):
+                break
+            codes = array('H', data[position:position + 2 * count])
+            if sys.byteorder == "big":
+                codes.byteswap()
+            self.deals[key] = [decode_action(code) for code in codes]
+            position += 2 * count
+            end = position
+        return taken, end
+
+    def compact(self):
+        # Rewrite the file with only the waiting deals
+        self.file.close()
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as file:
+            file.write(FILE_HEADER)
+            for (seed, draw_count), moves in self.deals.items():
+                file.write(self.added_record(seed, draw_count, moves))
+        os.replace(temporary, self.path)
+        self.file = open(self.path, "ab")
+
+    def added_record(self, seed, draw_count, moves):
+        codes = array('H', (encode_move(move) for move in moves))
+        if sys.byteorder == "big":
+            codes.byteswap()
+        return RECORD.pack(ADDED, DRAW_THREE if draw_count == 3 else 0, seed) + MOVE_COUNT.pack(len(codes)) + \
+            codes.tobytes()
+
+    def add(self, seed, draw_count, moves):
+        # Put a winnable deal and its winning moves in the pool (a deal already waiting is ignored)
+        if (seed, draw_count) in self.deals:
+            return
+        self.deals[(seed, draw_count)] = list(moves)
+        self.file.write(self.added_record(seed, draw_count, moves))
+        self.file.flush()
+
+    def take(self, draw_count=1):
+        # Remove the oldest waiting deal with this draw count; returns (deal number, winning moves) or None
+        for seed, deal_draw_count in self.deals:
+            if deal_draw_count == draw_count:
+                moves = self.deals.pop((seed, draw_count))
+                self.file.write(RECORD.pack(TAKEN, DRAW_THREE if draw_count == 3 else 0, seed))
+                self.file.flush()
+                return seed, moves
+        return None
+
+    def count(self, draw_count=1):
+        return sum(deal_draw_count == draw_count for seed, deal_draw_count in self.deals)
+
+    def close(self):
+        self.file.close()
+
+def find_winnable(rng, draw_count, max_nodes):
+    # Deal random deal numbers until a bounded solve wins one; returns (deal number, winning moves)
+    while True:
+        seed = rng.randrange(2 ** 32)
+        result = solver.solve(Game(seed, draw_count), max_nodes)
+        if result.status == 'solved':
+            return seed, result.moves
+
+def pool_worker(connection, draw_count, max_nodes):
+    # Producer process: for every request (a number of deals) send that many winnable deals back
+    # as (deal number, draw count, move codes), one at a time. None ends the process.
+    if hasattr(os, "nice"):
+        os.nice(10)  # Solving only fills the pool ahead of time; the game comes first
+    rng = random.Random()
+    wanted = 0
+    while True:
+        while wanted == 0 or connection.poll():
+            request = connection.recv()
+            if request is None:
+                return
+            wanted += request
+        seed, moves = find_winnable(rng, draw_count, max_nodes)
+        connection.send((seed, draw_count, [encode_move(move) for move in moves]))
+        wanted -= 1
+
+class PoolService:
+    # The game's side of the pool: the pool file and the producer process that keeps it filled.
+    # Start it before pygame so the producer does not inherit the display and loader threads.
+    def __init__(self, path, draw_count=1, size=POOL_SIZE, refill_at=REFILL_AT, max_nodes=MAX_NODES):
+        self.pool = DealPool(path)
+        self.draw_count = draw_count
+        self.size = size
+        self.refill_at = refill_at
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=pool_worker, args=(worker_connection, draw_count, max_nodes),
+                                               name="deal-pool", daemon=True)
+        self.process.start()
+        worker_connection.close()
+        self.requested = 0  # Deals asked of the producer and not yet received
+        self.refill()
+
+    def refill(self):
+        # Ask the producer to top the pool up to its size once it is down to the refill threshold
+        ready = self.pool.count(self.draw_count) + self.requested
+        if ready < self.refill_at:
+            self.connection.send(self.size - ready)
+            self.requested += self.size - ready
+
+    def poll(self):
+        # Store the deals the producer has sent since the last call
+        while self.connection.poll():
+            seed, draw_count, codes = self.connection.recv()
+            self.pool.add(seed, draw_count, [decode_action(code) for code in codes])
+            self.requested -= 1
+
+    def new_game(self):
+        # A Game dealt from the oldest deal in the pool, or None when the pool is empty
+        self.poll()
+        entry = self.pool.take(self.draw_count)
+        self.refill()
+        if entry is None:
+            return None
+        return Game(entry[0], self.draw_count)
+
+    def ready(self):
+        return self.pool.count(self.draw_count)
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.connection.close()
+        self.pool.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill a pool file with winnable deals ahead of time.")
+    parser.add_argument("path", help="pool file")
+    parser.add_argument("--size", type=int, default=POOL_SIZE, help="deals the pool should hold")
+    parser.add_argument("--draw", type=int, default=1, choices=(1, 3), help="cards turned per stockpile draw")
+    parser.add_argument("--max-nodes", type=int, default=MAX_NODES, help="node budget of the solve that checks a deal")
+    parser.add_argument("--seed", type=int, default=None, help="seed for picking deal numbers")
+    args = parser.parse_args()
+
+    pool = DealPool(args.path)
+    rng = random.Random(args.seed)
+    start_time = time.perf_counter()
+    added = 0
+    while pool.count(args.draw) < args.size:
+        seed, moves = find_winnable(rng, args.draw, args.max_nodes)
+        pool.add(seed, args.draw, moves)
+        added += 1
+    elapsed = time.perf_counter() - start_time
+    print(f"{added} deals added in {elapsed:.2f}s; {pool.count(args.draw)} draw-{args.draw} deals ready",
+          file=sys.stderr)
+    pool.close()
+
+if __name__ == '__main__':
+    main()
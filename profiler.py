@@ -0,0 +1,129 @@
+import json
+import os
+import sys
+import time
+from collections import deque
+
+# Opt-in per-frame instrumentation for the game loop. Phases of a frame are timed with
+# start(name)/stop() (they may nest), blits are counted by the drawing code through `blits`,
+# and Python allocations are sampled with sys.getallocatedblocks(). Frame times feed the p50/p99
+# figures of the on-screen HUD, and every phase can be written out as a Chrome trace
+# (load it in chrome://tracing or https://ui.perfetto.dev).
+#
+# Switched off, start()/stop() return straight away, so the hooks can stay in the frame loop.
+# SOLITAIRE_TRACE=<path> switches profiling on from the start and writes the trace there on exit.
+
+FRAME_WINDOW = 600  # Frames kept for the percentiles (10 s at 60 FPS)
+MAX_TRACE_EVENTS = 500000  # Trace events kept in memory; later ones are dropped
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+class FrameProfiler:
+    def __init__(self, trace_path=None, window=FRAME_WINDOW):
+        self.trace_path = trace_path  # Where close() writes the Chrome trace, or None
+        self.enabled = trace_path is not None
+        self.hud = False  # True while the overlay is shown
+        self.frame_times = deque(maxlen=window)  # Seconds of work per frame (idle waiting excluded)
+        self.phases = {}  # Phase name -> seconds spent in it during the current frame
+        self.last_phases = {}  # Same for the last finished frame
+        self.blits = 0  # Blits made during the current frame; drawing code adds to it
+        self.last_blits = 0
+        self.last_allocations = 0  # Change in allocated memory blocks over the last frame
+        self.open_phases = []  # Stack of (name, start time) of the phases running now
+        self.frame_start = None
+        self.allocated_at_start = 0
+        self.origin = time.perf_counter()  # Time zero of the trace
+        self.trace_events = []
+
+    def toggle_hud(self):
+        # Show or hide the overlay; showing it switches profiling on
+        self.hud = not self.hud
+        if self.hud:
+            self.enabled = True
+        elif self.trace_path is None:
+            self.enabled = False
+
+    def begin_frame(self):
+        self.blits = 0
+        if not self.enabled:
+            return
+        self.phases = {}
+        self.allocated_at_start = sys.getallocatedblocks()
+        self.frame_start = time.perf_counter()
+
+    def start(self, name):
+        if self.enabled:
+            self.open_phases.append((name, time.perf_counter()))
+
+    def stop(self):
+        # End the innermost running phase
+        if not self.enabled or not self.open_phases:
+            return
+        end = time.perf_counter()
+        name, start = self.open_phases.pop()
+        self.phases[name] = self.phases.get(name, 0.0) + end - start
+        self.add_trace_event(name, start, end)
+
+    def timed(self, name, function):
+        # `function` wrapped in a phase, or `function` itself while profiling is off
+        if not self.enabled:
+            return function
+        def timed_function(*args, **kwargs):
+            self.start(name)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.stop()
+        return timed_function
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            self.frame_start = None
+            return
+        end = time.perf_counter()
+        self.frame_times.append(end - self.frame_start)
+        self.last_phases = self.phases
+        self.last_blits = self.blits
+        self.last_allocations = sys.getallocatedblocks() - self.allocated_at_start
+        self.add_trace_event("frame", self.frame_start, end)
+        if self.trace_path is not None and len(self.trace_events) < MAX_TRACE_EVENTS:
+            self.trace_events.append({'name': "frame counters", 'ph': "C", 'pid': 0, 'tid': 0,
+                                      'ts': round((end - self.origin) * 1e6, 1),
+                                      'args': {'blits': self.last_blits, 'allocations': self.last_allocations}})
+        self.frame_start = None
+
+    def add_trace_event(self, name, start, end):
+        if self.trace_path is not None and len(self.trace_events) < MAX_TRACE_EVENTS:
+            self.trace_events.append({'name': name, 'ph': "X", 'pid': 0, 'tid': 0,
+                                      'ts': round((start - self.origin) * 1e6, 1),
+                                      'dur': round((end - start) * 1e6, 1)})
+
+    def frame_percentiles(self):
+        # (p50, p99) frame time in milliseconds over the recent frames
+        times = sorted(self.frame_times)
+        return percentile(times, 0.50) * 1000, percentile(times, 0.99) * 1000
+
+    def hud_lines(self):
+        # Text lines for the overlay
+        p50, p99 = self.frame_percentiles()
+        lines = [f"frame p50 {p50:.2f} ms  p99 {p99:.2f} ms  ({len(self.frame_times)} frames)",
+                 f"blits {self.last_blits}  alloc blocks {self.last_allocations:+d}"]
+        for name, seconds in sorted(self.last_phases.items(), key=lambda item: -item[1]):
+            lines.append(f"{name:16} {seconds * 1000:7.3f} ms")
+        return lines
+
+    def close(self):
+        # Write the Chrome trace, if one was asked for
+        if self.trace_path is None:
+            return
+        with open(self.trace_path, "w") as trace_file:
+            json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': "ms"}, trace_file)
+        self.trace_events = []
+
+def from_environment():
+    # Profiler configured from SOLITAIRE_TRACE (unset: off until the HUD is toggled on)
+    return FrameProfiler(os.environ.get("SOLITAIRE_TRACE") or None)
@@ -0,0 +1,285 @@
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from classes import DEAL_BYTES, DRAW_MOVE, Game
+
+# Binary replay archive. A file holds any number of games, one after another, so games can be
+# appended to it forever and read back sequentially through mmap without loading the file:
+#
+#   file header  b"SOLR", version (1 byte), 3 reserved bytes
+#   game header  flags (1 byte): bit 0 = dealt from a deal number, bit 1 = draw-3
+#                then the deal number (8 bytes, little-endian) or the deal bytes (DEAL_BYTES)
+#   actions      2 bytes each, little-endian (see encode_move), ended by END
+#
+# The game's writer sets aside a file it cannot read (renamed to .bad) and starts a new one, so a
+# damaged log never stops the game from starting; the verify command reports it instead.
+# A game whose END is missing (the program died mid-game) runs to the end of the file; the writer
+# closes such a game with an END before it appends the next one, so only the last game can be unfinished.
+#
+# Action bits:  15-14 source (0 tableau, 1 waste, 2 foundation, 3 special)
+#               13-11 source pile index
+#               10    destination (0 tableau, 1 foundation)
+#               9-7   destination pile index
+#               6-0   number of cards
+# Special actions use source 3 and the source index: 0 stock draw, 1 undo, 2 redo, 7 end of game.
+
+MAGIC = b"SOLR"
+VERSION = 1
+FILE_HEADER = MAGIC + bytes([VERSION, 0, 0, 0])
+SEEDED = 1  # Game header flag bits
+DRAW_THREE = 2
+
+SOURCES = ('tableau', 'waste', 'foundation')
+PILE_COUNTS = {'tableau': 7, 'waste': 1, 'foundation': 4}
+DESTINATIONS = ('tableau', 'foundation')
+SPECIAL = 3
+DRAW = SPECIAL << 14
+UNDO = DRAW | 1 << 11
+REDO = DRAW | 2 << 11
+END = 0xFFFF
+END_BYTES = END.to_bytes(2, "little")
+
+def encode_move(move):
+    # Action code for a move tuple (see Game.apply_move)
+    from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+    if from_pile_name == "stock":
+        return DRAW
+    if from_pile_name == "waste":
+        from_index = 0  # The UI calls the waste pile -1
+    return SOURCES.index(from_pile_name) << 14 | from_index << 11 | DESTINATIONS.index(to_pile_name) << 10 | \
+        to_index << 7 | num_cards
+
+def decode_action(code):
+    # Move tuple for an action code, the UNDO / REDO / END code itself, or None for a code that
+    # names no pile of the game (a damaged file)
+    source = code >> 14
+    if source == SPECIAL:
+        if code == DRAW:
+            return DRAW_MOVE
+        return code if code in (UNDO, REDO, END) else None
+    move = (SOURCES[source], code >> 11 & 7, DESTINATIONS[code >> 10 & 1], code >> 7 & 7, code & 0x7F)
+    from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+    if from_index >= PILE_COUNTS[from_pile_name] or to_index >= PILE_COUNTS[to_pile_name] or num_cards == 0:
+        return None
+    return move
+
+class ReplayWriter:
+    # Appends games to a replay file. Every action is flushed as it is written, so a crash loses
+    # at most the action being written. Actions outside begin_game()/end_game() (e.g. in a game
+    # resumed from a save) are not recorded.
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path) and os.path.getsize(path):
+            try:
+                self.close_unfinished_game(path)
+            except ValueError as error:
+                os.replace(path, path + ".bad")
+                print(f"{error}; moved it to {path}.bad and started a new replay file", file=sys.stderr)
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(FILE_HEADER)
+        self.in_game = False
+
+    def close_unfinished_game(self, path):
+        # If the last game in the file has no END (the program died mid-game), drop a half-written
+        # action and end it, so the next game's header is not read as part of its actions
+        reader = ReplayReader(path)
+        last = None
+        for last in reader:
+            pass
+        cut_at = reader.cut_at
+        reader.close()
+        if cut_at is not None:
+            with open(path, "r+b") as file:
+                file.truncate(cut_at)  # A header cut short: the game never had an action
+        elif last is not None and not last.finished:
+            with open(path, "r+b") as file:
+                file.truncate(last.end)
+                file.seek(last.end)
+                file.write(END_BYTES)
+
+    def write(self, code):
+        if self.in_game:
+            self.file.write(code.to_bytes(2, "little"))
+            self.file.flush()
+
+    def begin_game(self, game):
+        if self.in_game:
+            self.end_game()
+        if game.seed is not None and 0 <= game.seed < 2 ** 64:
+            header = struct.pack("<BQ", SEEDED | (DRAW_THREE if game.draw_count == 3 else 0), game.seed)
+        else:
+            header = bytes([DRAW_THREE if game.draw_count == 3 else 0]) + game.deal
+        self.file.write(header)
+        self.in_game = True
+
+    def move(self, move):
+        self.write(encode_move(move))
+
+    def undo(self):
+        self.write(UNDO)
+
+    def redo(self):
+        self.write(REDO)
+
+    def end_game(self):
+        if self.in_game:
+            self.file.write(END_BYTES)
+            self.file.flush()
+            self.in_game = False
+
+    def close(self):
+        self.end_game()
+        self.file.close()
+
+class ReplayGame:
+    # One recorded game: how it was dealt and where its actions lie in the file
+    def __init__(self, number, seed, deal, draw_count, data, start, end, finished=True):
+        self.number = number  # Position of the game in its file
+        self.seed = seed
+        self.deal = deal
+        self.draw_count = draw_count
+        self.data = data  # Buffer the game was read from (the mapped file)
+        self.start = start  # Offset of the first action
+        self.end = end  # Offset just past the last action
+        self.finished = finished  # False when the game has no END (it runs to the end of the file)
+
+    def __len__(self):
+        return (self.end - self.start) // 2
+
+    def actions(self):
+        # Action codes as an array of unsigned 16-bit ints
+        codes = array('H', self.data[self.start:self.end])
+        if sys.byteorder == "big":
+            codes.byteswap()
+        return codes
+
+    def new_game(self):
+        return Game(self.seed, self.draw_count, None if self.seed is not None else self.deal)
+
+    def replay(self, upto=None):
+        # Play the first `upto` actions (all by default) on a fresh deal.
+        # Returns (game, number of actions played); it stops early at the first illegal action.
+        game = self.new_game()
+        played = 0
+        for code in self.actions()[:upto]:
+            action = decode_action(code)
+            if action == UNDO:
+                ok = game.undo()
+            elif action == REDO:
+                ok = game.redo()
+            elif action is None or action == END:
+                ok = False  # A damaged action code
+            else:
+                ok = game.apply_move(action) == ""
+            if not ok:
+                break
+            played += 1
+        return game, played
+
+class ReplayReader:
+    # Reads games from a replay file in order through a read-only memory map
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        error = None
+        if size and (size < len(FILE_HEADER) or self.data[:len(MAGIC)] != MAGIC):
+            error = f"{path} is not a replay file"
+        elif size and self.data[len(MAGIC)] != VERSION:
+            error = f"{path} has replay format version {self.data[len(MAGIC)]}, expected {VERSION}"
+        if error is not None:
+            self.close()
+            raise ValueError(error)
+        self.cut_at = None  # Offset of a game header cut short at the end of the file, once iteration gets there
+
+    def __iter__(self):
+        data = self.data
+        size = len(data)
+        position = len(FILE_HEADER)
+        number = 0
+        while position < size:
+            header_start = position
+            flags = data[position]
+            position += 1
+            if position + (8 if flags & SEEDED else DEAL_BYTES) > size:
+                self.cut_at = header_start  # The program died while writing this header
+                break
+            if flags & SEEDED:
+                seed, = struct.unpack_from("<Q", data, position)
+                deal = None
+                position += 8
+            else:
+                seed = None
+                deal = bytes(data[position:position + DEAL_BYTES])
+                position += DEAL_BYTES
+            start = position
+            end = data.find(END_BYTES, start)
+            while end != -1 and (end - start) % 2:
+                end = data.find(END_BYTES, end + 1)  # Bytes of two neighbouring actions, not an END
+            finished = end != -1
+            if not finished:
+                end = size - (size - start) % 2  # Unfinished last game
+                position = size
+            else:
+                position = end + 2
+            yield ReplayGame(number, seed, deal, 3 if flags & DRAW_THREE else 1, data, start, end, finished)
+            number += 1
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+def verify(path, out):
+    # Replay every game in the file; report illegal actions and count wins
+    games = wins = actions = bad = 0
+    start_time = time.perf_counter()
+    reader = ReplayReader(path)
+    for record in reader:
+        game, played = record.replay()
+        games += 1
+        actions += played
+        if played != len(record):
+            bad += 1
+            print(f"game {record.number}: action {played} is illegal", file=out)
+        elif game.check_win():
+            wins += 1
+    reader.close()
+    elapsed = time.perf_counter() - start_time
+    print(f"{games} games, {wins} won, {bad} with illegal actions; {actions} actions replayed in {elapsed:.2f}s "
+          f"({actions / elapsed if elapsed else 0:.0f} actions/s)", file=out)
+    return bad == 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify or inspect recorded games.")
+    parser.add_argument("path", help="replay file")
+    parser.add_argument("--game", type=int, default=None, help="print the position of this game instead of verifying")
+    parser.add_argument("--upto", type=int, default=None, help="with --game: number of actions to replay")
+    args = parser.parse_args()
+
+    try:
+        if args.game is None:
+            sys.exit(0 if verify(args.path, sys.stdout) else 1)
+        reader = ReplayReader(args.path)
+    except ValueError as error:
+        sys.exit(f"error: {error}")  # Unlike the game, the checker does not put up with a bad file
+    for record in reader:
+        if record.number == args.game:
+            game, played = record.replay(args.upto)
+            print(f"game {record.number}: deal {record.seed if record.seed is not None else record.deal.hex()}, "
+                  f"draw {record.draw_count}, {played} of {len(record)} actions")
+            print(game)
+            break
+    else:
+        print(f"no game {args.game} in {args.path}")
+    reader.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import mmap
+import os
+import struct
+from classes import DEAL_BYTES, Game, card_from_code
+
+# Save slots for games in progress. A game is stored as a fixed-size binary snapshot: the deal,
+# every pile as card codes, which cards are face up, and the player's score, move count and
+# time. Slots live side by side in one file that stays memory-mapped, so saving is a
+# struct.pack_into on mapped memory (a few microseconds) and can run after every move.
+#
+#   file header  b"SOLSAVES", file version, slot count, slot size (all 2-byte little-endian)
+#   slot         snapshot (see SNAPSHOT_FORMATS), zero padded to the slot size; all zeros when empty
+#
+# Every snapshot starts with its own magic and version, and the formats of earlier versions are
+# kept in SNAPSHOT_FORMATS, so slots written by older versions can still be loaded.
+
+FILE_MAGIC = b"SOLSAVES"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<8sHHH")
+SNAPSHOT_MAGIC = b"SNAP"
+SNAPSHOT_VERSION = 1
+SLOT_SIZE = 256  # Bytes per slot; leaves room for bigger snapshot versions
+SLOT_COUNT = 4
+AUTOSAVE_SLOT = 0  # Written after every move
+QUICK_SLOT = 1  # Written and read on request (F5 / F9 in the game)
+SEEDED = 1  # Snapshot flag bit: the game was dealt from a deal number
+
+# Snapshot layout per version. Version 1:
+#   magic, version, flags, deal number, deal bytes, draw count,
+#   pile sizes (7 tableau, 4 foundation, stock, waste), card codes pile by pile (bottom card first,
+#   stockpile front first), face-up bits by card code, score, move count, elapsed seconds
+SNAPSHOT_FORMATS = {
+    1: struct.Struct(f"<4sBBQ{DEAL_BYTES}sB13s52sQiId"),
+}
+PILE_COUNTS = (7, 4, 1, 1)  # Tableau, foundation, stock, waste entries of the pile sizes
+
+def pack_snapshot(buffer, offset, game, score=0, moves=0, elapsed=0.0):
+    # Write a snapshot of `game` into `buffer` at `offset`
+    piles = [pile.display() for pile in game.tableau.piles.values()]
+    piles += [pile.items for pile in game.foundation.piles]
+    piles.append(game.stockpile.display())
+    piles.append(game.waste_pile.cards.items)
+    codes = bytearray()
+    face_up = 0
+    for cards in piles:
+        for card in cards:
+            codes.append(card.code)
+            if card.face_up:
+                face_up |= 1 << card.code
+    seeded = game.seed is not None and 0 <= game.seed < 2 ** 64
+    SNAPSHOT_FORMATS[SNAPSHOT_VERSION].pack_into(
+        buffer, offset, SNAPSHOT_MAGIC, SNAPSHOT_VERSION, SEEDED if seeded else 0, game.seed if seeded else 0,
+        game.deal, game.draw_count, bytes(len(cards) for cards in piles), bytes(codes), face_up, score, moves,
+        elapsed)
+
+def unpack_snapshot(buffer, offset=0):
+    # Rebuild (game, score, moves, elapsed) from a snapshot, or return None if there is none at
+    # `offset` or it was written by a newer version of the game. The game is built straight in the
+    # saved position; no deal is shuffled and thrown away.
+    if bytes(buffer[offset:offset + 4]) != SNAPSHOT_MAGIC:
+        return None
+    version = buffer[offset + 4]
+    if version not in SNAPSHOT_FORMATS:
+        return None
+    (magic, version, flags, seed, deal, draw_count, sizes, codes, face_up, score, moves,
+     elapsed) = SNAPSHOT_FORMATS[version].unpack_from(buffer, offset)
+    piles = []
+    position = 0
+    for size in sizes:
+        piles.append([card_from_code(code, bool(face_up >> code & 1)) for code in codes[position:position + size]])
+        position += size
+    tableau, foundation, (stock, waste) = piles[:7], piles[7:11], piles[11:]
+    game = Game(seed if flags & SEEDED else None, draw_count, deal, (tableau, foundation, stock, waste))
+    return game, score, moves, elapsed
+
+class SaveSlots:
+    # A file of fixed-size save slots, kept memory-mapped while the game runs
+    def __init__(self, path, slot_count=SLOT_COUNT):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        size = FILE_HEADER.size + slot_count * SLOT_SIZE
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self.file = open(path, mode)
+        header = self.file.read(FILE_HEADER.size)
+        readable = len(header) == FILE_HEADER.size and header[:8] == FILE_MAGIC
+        if readable and FILE_HEADER.unpack(header)[3] == SLOT_SIZE:
+            magic, file_version, slot_count, slot_size = FILE_HEADER.unpack(header)
+            size = FILE_HEADER.size + slot_count * SLOT_SIZE
+        else:
+            # New or unreadable file, or slots of another size: lay out empty slots
+            self.file.seek(0)
+            self.file.truncate()
+            self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, slot_count, SLOT_SIZE))
+        self.file.truncate(size)
+        self.slot_count = slot_count
+        self.map = mmap.mmap(self.file.fileno(), size)
+
+    def offset(self, slot):
+        if not 0 <= slot < self.slot_count:
+            raise IndexError(f"no save slot {slot}")
+        return FILE_HEADER.size + slot * SLOT_SIZE
+
+    def save(self, slot, game, score=0, moves=0, elapsed=0.0):
+        pack_snapshot(self.map, self.offset(slot), game, score, moves, elapsed)
+
+    def load(self, slot):
+        # (game, score, moves, elapsed) saved in the slot, or None if it is empty
+        return unpack_snapshot(self.map, self.offset(slot))
+
+    def clear(self, slot):
+        offset = self.offset(slot)
+        self.map[offset:offset + SLOT_SIZE] = bytes(SLOT_SIZE)
+
+    def close(self):
+        # Push the mapped pages to disk and release the file
+        self.map.flush()
+        self.map.close()
+        self.file.close()
@@ -0,0 +1,120 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from classes import Game
+import solver
+
+MAX_STEPS = 2000  # Greedy/random games are cut off after this many moves
+
+def play_greedy(game, seed, max_nodes):
+    # Always play the best-ordered legal move that leads to a position not seen before in this game
+    return play_policy(game, lambda moves: moves[-1])
+
+def play_random(game, seed, max_nodes):
+    # Play a uniformly random legal move that leads to a new position
+    rng = random.Random(seed)
+    return play_policy(game, rng.choice)
+
+def play_solver(game, seed, max_nodes):
+    # Search for a win with the solver, then play its line out
+    result = solver.solve(game, max_nodes)
+    for move in result.moves:
+        game.apply_move(move)
+    return {'moves': len(result.moves), 'nodes': result.nodes, 'status': result.status}
+
+def play_policy(game, choose):
+    # Shared loop for the one-ply policies; positions are remembered by canonical hash so a game cannot cycle.
+    # Safe foundation moves are played after every move and are not counted as moves of the policy.
+    game.auto_play()
+    seen = {game.canonical_hash()}
+    moves_played = 0
+    while moves_played < MAX_STEPS and not game.check_win():
+        if game.can_finish() and game.finish_game() is not None:
+            break
+        moves = solver.ordered_moves(game)  # Best move last
+        while moves:
+            move = choose(moves)
+            moves.remove(move)
+            game.apply_move(move)
+            played = 1 + len(game.auto_play())
+            if game.canonical_hash() not in seen:
+                break
+            for _ in range(played):
+                game.undo()
+        else:
+            break  # Every move leads back to a known position: the policy is stuck
+        seen.add(game.canonical_hash())
+        moves_played += 1
+    return {'moves': moves_played}
+
+POLICIES = {
+    'greedy': play_greedy,
+    'random': play_random,
+    'solver': play_solver,
+}
+
+def play_deal(seed, policy, draw_count, max_nodes):
+    # Play one seeded deal headlessly and return its result record
+    start_time = time.perf_counter()
+    game = Game(seed, draw_count)
+    record = {'seed': seed, 'policy': policy, 'draw': draw_count}
+    record.update(POLICIES[policy](game, seed, max_nodes))
+    record['won'] = game.check_win()
+    record['elapsed'] = round(time.perf_counter() - start_time, 6)
+    return record
+
+def play_chunk(seeds, policy, draw_count, max_nodes):
+    # Play a whole chunk of deals in one worker call so results cross the process boundary in batches
+    return [play_deal(seed, policy, draw_count, max_nodes) for seed in seeds]
+
+def run(first_seed, deals, policy, draw_count, workers, chunk_size, max_nodes, out):
+    # Spread the deals over a process pool and stream one JSON line per deal to `out`.
+    # Returns (deals played, deals won, seconds taken).
+    chunks = [range(seed, min(seed + chunk_size, first_seed + deals))
+              for seed in range(first_seed, first_seed + deals, chunk_size)]
+    won = 0
+    start_time = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(play_chunk, chunks, [policy] * len(chunks), [draw_count] * len(chunks),
+                               [max_nodes] * len(chunks))
+        for chunk_results in results:
+            for record in chunk_results:
+                won += record['won']
+                if out is not None:
+                    out.write(json.dumps(record) + "\n")
+            if out is not None:
+                out.flush()
+    return deals, won, time.perf_counter() - start_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many seeded deals headlessly across all cores.")
+    parser.add_argument("--seed", type=int, default=0, help="deal number of the first deal")
+    parser.add_argument("--deals", type=int, default=1000, help="number of deals to play")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy", help="how moves are chosen")
+    parser.add_argument("--draw", type=int, default=1, choices=(1, 3), help="cards turned per stockpile draw")
+    parser.add_argument("--workers", default=str(os.cpu_count()),
+                        help="worker processes; a comma list (e.g. 1,2,4,8) measures scaling, replaying the deals "
+                             "once per count (only the first run's records are written)")
+    parser.add_argument("--chunk-size", type=int, default=64, help="deals handed to a worker at a time")
+    parser.add_argument("--max-nodes", type=int, default=20000, help="node budget per deal for the solver policy")
+    parser.add_argument("--out", default="-", help="JSON lines output file ('-' for stdout, '' for none)")
+    args = parser.parse_args()
+
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    out = sys.stdout if args.out == "-" else (open(args.out, "w") if args.out else None)
+    for run_index, workers in enumerate(worker_counts):
+        # Later runs of a scaling sweep play the same deals again; their records would count every deal twice
+        deals, won, elapsed = run(args.seed, args.deals, args.policy, args.draw, workers, args.chunk_size,
+                                  args.max_nodes, out if run_index == 0 else None)
+        # The report goes to stderr so stdout stays a clean JSON lines stream
+        print(f"{workers} worker(s): {deals} deals in {elapsed:.2f}s = {deals / elapsed:.1f} deals/s, "
+              f"{deals / elapsed / workers:.1f} deals/s per worker, win rate {won / deals:.1%}", file=sys.stderr)
+    if out not in (None, sys.stdout):
+        out.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import time
+from classes import Game, Stack
+
+class SolveResult:
+    def __init__(self, status, moves, nodes, elapsed):
+        self.status = status  # 'solved', 'unwinnable', 'budget' (node/time budget ran out) or 'stopped' (by visit)
+        self.moves = moves  # Winning move sequence when solved, otherwise []
+        self.nodes = nodes  # Number of distinct positions visited
+        self.elapsed = elapsed  # Seconds spent searching
+
+    def __str__(self):
+        return f"{self.status} in {len(self.moves)} moves ({self.nodes} nodes, {self.elapsed:.3f}s)"
+
+def ordered_moves(game):
+    # Legal moves worth searching, best last so the search can pop them off the end.
+    # Moves that only swap which empty pile is used, or that move a whole pile into an empty one, are skipped.
+    moves = []
+    first_empty = None
+    for i, pile in game.tableau.piles.items():
+        if pile.is_empty():
+            first_empty = i
+            break
+    for move in game.legal_moves():
+        from_pile_name, from_index, to_pile_name, to_index, num_cards = move
+        if to_pile_name == "tableau" and to_index != first_empty and game.tableau.piles[to_index].is_empty():
+            continue
+        if to_index == first_empty and to_pile_name == "tableau" and from_pile_name == "tableau" and \
+                game.tableau.piles[from_index].size() == num_cards:
+            continue
+        moves.append(move)
+    moves.sort(key=game.move_priority, reverse=True)
+    return moves
+
+def solve(game, max_nodes=200000, time_limit=None, visit=None, auto_play=True):
+    # Depth-first search for a winning line from the current position of `game`.
+    # Visited positions are kept in a transposition table so each one is expanded once.
+    # With auto_play, safe foundation moves (Game.next_safe_move) are played right after every move
+    # as part of it, and a position that Game.finish_game plays out counts as solved.
+    # `visit(game, path)`, if given, is called at every new position (path = moves from the start);
+    # a true return value stops the search.
+    # The game is put back in its starting position before returning.
+    start_time = time.perf_counter()
+    saved_redo = game.redo_history
+    game.redo_history = Stack()
+    path = game.auto_play() if auto_play else []
+    steps = [len(path)]  # Moves that led to each position on the frontier (a move and its safe moves)
+    seen = {game.canonical_hash()}  # Transposition table of canonical Zobrist hashes
+    frontier = [ordered_moves(game)]
+    nodes = 1
+    status = 'unwinnable'
+    while frontier:
+        if game.check_win():
+            status = 'solved'
+            break
+        if auto_play and game.can_finish():
+            finish = game.finish_game()
+            if finish is not None:
+                path.extend(finish)
+                status = 'solved'
+                break
+        moves = frontier[-1]
+        if not moves:
+            frontier.pop()  # Every move from this position failed: step back
+            for _ in range(steps.pop()):
+                path.pop()
+                game.undo()
+            continue
+        move = moves.pop()
+        if game.apply_move(move) != "":
+            continue
+        played = [move] + game.auto_play() if auto_play else [move]
+        key = game.canonical_hash()
+        if key in seen:
+            for _ in played:
+                game.undo()  # Position already searched through another line
+            continue
+        seen.add(key)
+        nodes += 1
+        path.extend(played)
+        steps.append(len(played))
+        frontier.append(ordered_moves(game))
+        if visit is not None and visit(game, path):
+            status = 'stopped'
+            break
+        if nodes >= max_nodes or (time_limit is not None and time.perf_counter() - start_time > time_limit):
+            status = 'budget'
+            break
+    moves = list(path) if status == 'solved' else []
+    for _ in path:
+        game.undo()
+    game.redo_history = saved_redo
+    return SolveResult(status, moves, nodes, time.perf_counter() - start_time)
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve Klondike deals headlessly.")
+    parser.add_argument("--seed", type=int, default=0, help="deal number of the first deal")
+    parser.add_argument("--deals", type=int, default=1, help="number of consecutive deals to solve")
+    parser.add_argument("--draw", type=int, default=1, choices=(1, 3), help="cards turned per stockpile draw")
+    parser.add_argument("--max-nodes", type=int, default=200000, help="node budget per deal")
+    parser.add_argument("--time-limit", type=float, default=None, help="time budget per deal in seconds")
+    parser.add_argument("--show-moves", action="store_true", help="print the winning move sequence")
+    parser.add_argument("--no-auto-play", action="store_true",
+                        help="search safe foundation moves like any other move instead of playing them straight away")
+    args = parser.parse_args()
+
+    counts = {'solved': 0, 'unwinnable': 0, 'budget': 0}
+    start_time = time.perf_counter()
+    for seed in range(args.seed, args.seed + args.deals):
+        game = Game(seed, args.draw)
+        result = solve(game, args.max_nodes, args.time_limit, auto_play=not args.no_auto_play)
+        counts[result.status] += 1
+        print(f"deal {seed}: {result}")
+        if args.show_moves:
+            for move in result.moves:
+                print("   ", move)
+    elapsed = time.perf_counter() - start_time
+    print(f"{counts['solved']} solved, {counts['unwinnable']} unwinnable, {counts['budget']} over budget; "
+          f"{args.deals / elapsed:.2f} deals/s")
+
+if __name__ == '__main__':
+    main()
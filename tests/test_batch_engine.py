@@ -0,0 +1,91 @@
+import random
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from actions import action_to_move, legal_actions
+from batch_engine import BatchGame, choose_actions
+from classes import Game
+
+# The batch engine must follow Game move for move: the same legal actions, the same position
+# after every action and the same wins, for random and greedy play in draw-1 and draw-3.
+
+DEALS = 40
+STEPS = 400
+
+def position(game):
+    # (tableau codes, face-down counts, foundation codes, talon codes waste first, waste size) of a Game
+    tableau = [[card.code for card in pile.display()] for pile in game.tableau.piles.values()]
+    face_down = [sum(not card.face_up for card in pile.display()) for pile in game.tableau.piles.values()]
+    foundation = [[card.code for card in pile.items] for pile in game.foundation.piles]
+    talon = [card.code for card in game.waste_pile.cards.items + game.stockpile.display()]
+    return tableau, face_down, foundation, talon, game.waste_pile.cards.size()
+
+def batch_position(batch, n):
+    # The same for game n of a BatchGame
+    tableau = [[int(code) for code in batch.tableau[n, i, :batch.tableau_sizes[n, i]]] for i in range(7)]
+    face_down = [int(count) for count in batch.face_down[n]]
+    foundation = [[int(batch.foundation_suits[n, slot]) * 13 + rank for rank in range(batch.foundation_sizes[n, slot])]
+                  for slot in range(4)]
+    talon = [int(code) for code in batch.talon[n, :batch.talon_sizes[n]]]
+    return tableau, face_down, foundation, talon, int(batch.waste_sizes[n])
+
+def check_lockstep(batch, games, mask):
+    won = batch.won()
+    for n, game in enumerate(games):
+        assert batch_position(batch, n) == position(game), n
+        assert won[n] == game.check_win(), n
+        if not won[n]:
+            assert list(np.flatnonzero(mask[n])) == sorted(set(legal_actions(game))), n
+
+def play_games(games, actions):
+    for game, action in zip(games, actions):
+        if action >= 0:
+            assert game.apply_move(action_to_move(game, int(action))) == ""
+
+@pytest.mark.parametrize("draw_count", [1, 3])
+def test_random_play_matches_game(draw_count):
+    games = [Game(seed, draw_count) for seed in range(DEALS)]
+    batch = BatchGame(DEALS, draw_count)
+    batch.deal(range(DEALS))
+    rng = random.Random(draw_count)
+    for step in range(STEPS):
+        mask = batch.legal_mask()
+        check_lockstep(batch, games, mask)
+        actions = []
+        for n in range(DEALS):
+            legal = list(np.flatnonzero(mask[n]))
+            moves = [action for action in legal if action]  # Mostly not a draw, so the tableau gets played
+            actions.append(rng.choice(moves) if moves and rng.random() < 0.7 else rng.choice(legal) if legal else -1)
+        play_games(games, actions)
+        assert list(batch.step(actions, mask)) == [action >= 0 for action in actions]
+    check_lockstep(batch, games, batch.legal_mask())
+
+@pytest.mark.parametrize("draw_count", [1, 3])
+def test_greedy_play_matches_game(draw_count):
+    games = [Game(seed, draw_count) for seed in range(DEALS)]
+    batch = BatchGame(DEALS, draw_count)
+    batch.deal(range(DEALS))
+    rng = np.random.default_rng(draw_count)
+    for step in range(STEPS * 2):
+        mask = batch.legal_mask()
+        mask[batch.won()] = False
+        if step % 20 == 0:
+            check_lockstep(batch, games, mask)
+        actions = choose_actions(batch, mask, rng, 'greedy')
+        play_games(games, actions)
+        batch.step(actions, mask)
+    check_lockstep(batch, games, batch.legal_mask())
+    assert batch.won().any()  # Greedy play wins some of these deals, so wins are compared too
+
+def test_load_game_and_illegal_actions():
+    game = Game(5, 3)
+    rng = random.Random(5)
+    for _ in range(60):
+        game.apply_move(rng.choice(game.legal_moves()))
+    batch = BatchGame(2, 3)
+    batch.load_game(0, game)
+    assert batch_position(batch, 0) == position(game)
+    before = batch.tableau.copy()
+    assert not batch.step([600, -1]).any()  # A move between piles that is not legal here, and no move
+    assert (batch.tableau == before).all()
@@ -0,0 +1,44 @@
+import random
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from actions import ACTION_COUNT
+from env import SolitaireEnv, SolitaireVectorEnv
+
+# SolitaireVectorEnv must give the same observations, masks, rewards and episode ends as one
+# SolitaireEnv per game, including after auto-resets.
+
+def test_vector_env_matches_single_env():
+    count = 24
+    vector_env = SolitaireVectorEnv(count, max_steps=200)
+    vector_env.reset(list(range(count)))
+    envs = [SolitaireEnv(max_steps=200) for _ in range(count)]
+    for seed, env in enumerate(envs):
+        env.reset(seed)
+    rng = random.Random(0)
+    episodes = 0
+    for step in range(500):
+        actions = []
+        for i, env in enumerate(envs):
+            assert (env.observation == vector_env.observations[i]).all(), (step, i)
+            assert (env.mask == vector_env.masks[i]).all(), (step, i)
+            legal = list(np.flatnonzero(env.mask))
+            moves = [action for action in legal if action]
+            actions.append(rng.choice(moves) if moves and rng.random() < 0.7 else rng.choice(legal))
+        observations, rewards, terminated, truncated, info = vector_env.step(actions)
+        for i, env in enumerate(envs):
+            observation, reward, env_terminated, env_truncated, env_info = env.step(actions[i])
+            assert (reward, env_terminated, env_truncated) == (rewards[i], terminated[i], truncated[i]), (step, i)
+            if env_terminated or env_truncated:
+                env.reset(vector_env.seeds[i])
+                episodes += 1
+    assert episodes  # Auto-resets were compared as well
+
+def test_illegal_action_changes_nothing():
+    env = SolitaireEnv()
+    env.reset(3)
+    before = env.observation.copy()
+    observation, reward, terminated, truncated, info = env.step(ACTION_COUNT - 1)
+    assert not info['legal'] and reward == 0
+    assert (observation == before).all()